@@ -0,0 +1,354 @@
+"""
+    This module benchmarks the ETL pipeline on synthetic data.
+    When executed:
+    - Generates museos, salas_cine and bibliotecas .csv files with the same column layout as the
+        real sources, with a given number of rows each (works offline).
+    - Runs process_data, save_sql_tables and update_database on them, recording the metrics
+        of each stage (throughput and, optionally, peak memory) with the metrics module.
+    - Loads the tables on the PostgreSQL database from the .env file (BENCHMARK_DATABASE),
+        or on a SQLite file if PostgreSQL is not available.
+    - Compares the throughput of each stage with a stored baseline.
+    With --normalize, it only benchmarks the normalization of the source values
+    (challenge.normalize_dataframe) against the previous row-wise version.
+
+    Usage:
+        python src/benchmark.py --rows 10000 1000000 10000000 [--database auto|postgres|sqlite]
+            [--baseline benchmark_baseline.json] [--save-baseline] [--trace-memory] [--normalize]
+"""
+
+#Imports
+#Data manipulation
+import pandas as pd
+import numpy as np
+#Files and arguments
+import io
+import os
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+#Database connection
+from sqlalchemy import create_engine
+import psql
+#Program modules
+import challenge
+import metrics
+import logger
+#Settings module
+import settings
+
+#Columns of the real sources not used by the pipeline (generated anyway, to keep the layout)
+unused_columns = {
+    "museos" : ["Observaciones", "subcategoria", "piso", "Latitud", "Longitud", "TipoLatitudLongitud",
+        "Info_adicional", "jurisdiccion", "año_inauguracion", "actualizacion"],
+    "salas_cine" : ["Observaciones", "Departamento", "Piso", "Información adicional", "Latitud",
+        "Longitud", "TipoLatitudLongitud", "tipo_gestion", "año_actualizacion"],
+    "bibliotecas" : ["Observacion", "Subcategoria", "Departamento", "Piso", "Información adicional",
+        "Latitud", "Longitud", "TipoLatitudLongitud", "Tipo_gestion", "año_inicio", "Año_actualizacion"]
+}
+#Real provincia ids (INDEC codes)
+provincia_ids = np.array([2, 6, 10, 14, 18, 22, 26, 30, 34, 38, 42, 46, 50, 54, 58, 62, 66, 70, 74, 78, 82, 86, 90, 94])
+#Categoria and fuente values of each source
+source_values = {
+    "museos" : ("Espacios de Exhibición Patrimonial", ["DNPyM", "RCC", "Gob. Pcia."]),
+    "salas_cine" : ("Salas de cine", ["INCAA / SInCA", "INCAA"]),
+    "bibliotecas" : ("Bibliotecas Populares", ["CONABIP", "Ministerio de Cultura"])
+}
+
+#Methods
+def get_synthetic_dataframe(name, n_rows, first_row, rng):
+    """
+    Generate synthetic rows of a source, with its real column layout.
+
+    Args:
+        name (str): Source name (a key of challenge.sources dictionary).
+        n_rows (int): Number of rows.
+        first_row (int): Number of the first row (used to build unique names).
+        rng (Generator): NumPy random generator.
+
+    Returns:
+        DataFrame: Synthetic source rows.
+    """
+    #Localidades (and its provincias) are drawn from a fixed set, with the real id layout
+    #('<provincia><departamento:3 digits><localidad:3 digits>')
+    id_provincia = rng.choice(provincia_ids, n_rows)
+    id_localidad = id_provincia * 1000000 + rng.integers(1, 20, n_rows) * 1000 + rng.integers(1, 10, n_rows) * 10
+    row_numbers = pd.Series(np.arange(first_row, first_row + n_rows)).astype(str)
+    categoria, fuentes = source_values[name]
+    #Area codes and phones, with some missing values
+    cod_area = pd.Series(rng.integers(11, 3900, n_rows).astype(float))
+    cod_area[rng.random(n_rows) < 0.05] = np.nan
+    telefono = pd.Series(rng.integers(4000000, 4999999, n_rows)).astype(str)
+    telefono[rng.random(n_rows) < 0.05] = 's/d'
+    #Values by espacios_culturales column name
+    values = {
+        "id_localidad" : id_localidad,
+        "id_provincia" : id_provincia,
+        "id_departamento" : id_localidad // 1000,
+        "categoria" : categoria,
+        "provincia" : 'Provincia ' + pd.Series(id_provincia).astype(str),
+        "localidad" : 'Localidad ' + pd.Series(id_localidad).astype(str),
+        "nombre" : name + ' ' + row_numbers,
+        "domicilio" : 'Calle ' + row_numbers,
+        "cp" : 'C' + pd.Series(rng.integers(1000, 9999, n_rows)).astype(str),
+        "cod_area" : cod_area,
+        "telefono" : telefono,
+        "mail" : name + row_numbers + '@mail.com',
+        "web" : 'www.' + name + row_numbers + '.gob.ar',
+        "fuente" : rng.choice(fuentes, n_rows)
+    }
+    df = pd.DataFrame({col: values[col_name] for col, col_name in
+        zip(challenge.source_registry[name]["columns"], challenge.source_column_names)})
+    #Extra columns of salas_cine
+    if name == "salas_cine":
+        df["Pantallas"] = rng.integers(1, 12, n_rows)
+        df["Butacas"] = rng.integers(50, 2000, n_rows)
+        df["espacio_INCAA"] = rng.choice(['SI', 'Si', '', 'No'], n_rows)
+    #Unused columns
+    for col in unused_columns[name]:
+        df[col] = ''
+    return df
+
+def generate_source_files(n_rows, chunk_size=1000000, seed=0):
+    """
+    Write synthetic .csv files for all the sources, on the paths where process_data looks for them.
+    Rows are generated and written by chunks, so memory usage doesn't depend on 'n_rows'.
+
+    Args:
+        n_rows (int): Number of rows of each file.
+        chunk_size (int, optional): Number of rows generated at once. Defaults to 1000000.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        int: Total size of the files in bytes.
+    """
+    rng = np.random.default_rng(seed)
+    n_bytes = 0
+    for name in challenge.sources.keys():
+        file_path = challenge.get_source_file_path(name)
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        for first_row in range(0, n_rows, chunk_size):
+            df = get_synthetic_dataframe(name, min(chunk_size, n_rows - first_row), first_row, rng)
+            df.to_csv(file_path, mode='w' if first_row == 0 else 'a', header=first_row == 0, index=False)
+        n_bytes += os.path.getsize(file_path)
+    return n_bytes
+
+def get_benchmark_engine(database, sqlite_path):
+    """
+    Get the database engine used by the benchmark.
+
+    Args:
+        database (str): 'postgres', 'sqlite' or 'auto' (PostgreSQL if available, SQLite otherwise).
+        sqlite_path (str): Path to the SQLite database file.
+
+    Returns:
+        Engine: Database engine.
+    """
+    if database in ['postgres', 'auto']:
+        try:
+            engine = psql.get_engine(settings.pg_user, settings.pg_password, settings.pg_host,
+                                     settings.pg_port, settings.benchmark_database)
+            engine.connect().close()
+            return engine
+        except Exception as e:
+            if database == 'postgres':
+                raise
+            print(f'PostgreSQL not available ({e.__class__.__name__}), using SQLite.')
+    return create_engine(f'sqlite:///{sqlite_path}')
+
+def create_tables(db, data, sql_path):
+    """
+    Create the tables of 'data' on the benchmark database (from the .sql script on PostgreSQL,
+    and from the DataFrames types on SQLite, which doesn't support that script).
+
+    Args:
+        db (Engine): Database engine.
+        data (dict): Containing table names as keys, and DataFrames as values.
+        sql_path (str): Path to the .sql script saved by save_sql_tables.
+    """
+    if db.dialect.name == 'postgresql':
+        psql.db = db
+        psql.execute_from_sql(sql_path)
+    else:
+        with db.connect() as con:
+            for df_name, df in data.items():
+                df.head(0).to_sql(df_name, con=con, if_exists='replace', index=False,
+                                  dtype=psql.get_dtypes_dict(df))
+
+def run(n_rows, database, work_path):
+    """
+    Run the benchmark with a given number of rows per source.
+
+    Args:
+        n_rows (int): Number of rows of each source file.
+        database (str): 'postgres', 'sqlite' or 'auto'.
+        work_path (str): Folder where the files are generated.
+
+    Returns:
+        dict: Results with '<stage>[:<source or table>]' keys, and dicts with the
+            'rows', 'wall_time', 'rows_per_second' and 'peak_memory' of each stage as values.
+    """
+    #Run the pipeline over the synthetic files, without caches
+    settings.default_data_path = os.path.join(work_path, 'data')
+    settings.id_mappings_path = os.path.join(work_path, 'id_mappings.json')
+    settings.row_ids_path = os.path.join(work_path, 'row_ids.pkl')
+    settings.metrics_path = os.path.join(work_path, f'metrics-{n_rows}.jsonl')
+    settings.processed_cache_path = ''
+    settings.load_mode = 'full'
+    metrics.start_run()
+    with metrics.stage('generate') as record:
+        record['bytes'] = generate_source_files(n_rows)
+    with metrics.stage('process'):
+        data = challenge.process_data()
+    with metrics.stage('save_sql_tables'):
+        sql_path = os.path.join(work_path, 'tables.sql')
+        challenge.save_sql_tables(sql_path, data)
+    db = get_benchmark_engine(database, os.path.join(work_path, 'benchmark.db'))
+    create_tables(db, data, sql_path)
+    with metrics.stage('update_database', database=db.dialect.name):
+        challenge.update_database(db, data)
+    db.dispose()
+    metrics.end_run()
+    return read_results(n_rows)
+
+def read_results(n_rows):
+    """
+    Read the metrics recorded by a benchmark run.
+
+    Args:
+        n_rows (int): Number of rows of each source file.
+
+    Returns:
+        dict: Results with '<stage>[:<source or table>]' keys, and dicts with the
+            'rows', 'wall_time', 'rows_per_second' and 'peak_memory' of each stage as values.
+    """
+    results = {}
+    with open(settings.metrics_path, 'r', encoding='utf_8') as file:
+        for line in file:
+            record = json.loads(line)
+            key = record['stage'] + ''.join(f':{record[field]}' for field in ['source', 'table'] if field in record)
+            rows = record.get('rows', n_rows * len(challenge.sources))
+            results[key] = {
+                'rows' : rows,
+                'wall_time' : record['wall_time'],
+                'rows_per_second' : round(rows / max(record['wall_time'], 1e-9)),
+                'peak_memory' : record.get('peak_memory')
+            }
+    return results
+
+def normalize_dataframe_rowwise(df):
+    """
+    Previous version of challenge.normalize_dataframe, with row-wise Python functions
+    (used as reference by the normalize benchmark).
+
+    Args:
+        df (DataFrame): Source dataframe, with the espacios_culturales column names.
+
+    Returns:
+        DataFrame: The same dataframe, normalized in place.
+    """
+    for col in df.columns[0:3]:
+        df[col] = pd.to_numeric(df[col])
+    for col in df.columns[3:-1]:
+        df[col] = df[col].astype(str)
+    df["cod_area"] = df["cod_area"].apply(lambda x : x.split('.')[0] if pd.notna(x) else x)
+    for col in ["cod_area", "telefono", "mail", "web"]:
+        df[col] = df[col].apply(lambda x : np.NaN if x in ['s/d', 'nan'] else x)
+    df["telefono"] = '(' + df["cod_area"] + ') ' + df["telefono"]
+    df.drop("cod_area", axis=1, inplace=True)
+    return df
+
+def run_normalize(n_rows, work_path):
+    """
+    Benchmark the normalization of 'n_rows' synthetic source rows: challenge.normalize_dataframe
+    against the previous row-wise version (both must give the same values).
+
+    Args:
+        n_rows (int): Number of rows.
+        work_path (str): Folder where the metrics are saved.
+
+    Returns:
+        dict: Results like the ones returned by run ('normalize:vectorized' and 'normalize:rowwise' keys).
+    """
+    settings.metrics_path = os.path.join(work_path, f'metrics-normalize-{n_rows}.jsonl')
+    #Source rows as read from its csv file
+    df = get_synthetic_dataframe("museos", n_rows, 0, np.random.default_rng(0))[challenge.source_registry["museos"]["columns"]]
+    df = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+    df.columns = challenge.source_column_names
+    metrics.start_run()
+    with metrics.stage('normalize', source='vectorized', rows=n_rows):
+        df_vectorized = challenge.normalize_dataframe(df.copy())
+    with metrics.stage('normalize', source='rowwise', rows=n_rows):
+        df_rowwise = normalize_dataframe_rowwise(df.copy())
+    metrics.end_run()
+    pd.testing.assert_frame_equal(df_vectorized, df_rowwise)
+    return read_results(n_rows)
+
+def compare(results, baseline, threshold):
+    """
+    Print the results, compared with a baseline.
+
+    Args:
+        results (dict): Results by number of rows (as str), like the ones returned by run.
+        baseline (dict): Baseline results, with the same structure.
+        threshold (float): Relative throughput drop considered a regression (like 0.2 for 20%).
+
+    Returns:
+        list: Keys ('<rows>/<stage>') of the stages with regressions.
+    """
+    regressions = []
+    for n_rows, stages in results.items():
+        print(f'\n{n_rows} rows per source')
+        print(f'{"stage":40} {"seconds":>10} {"rows/s":>12} {"peak MB":>9} {"vs baseline":>12}')
+        for key, result in stages.items():
+            peak_memory = f'{result["peak_memory"] / 2**20:.1f}' if result['peak_memory'] else '-'
+            comparison = '-'
+            base = baseline.get(n_rows, {}).get(key)
+            if base and base['rows_per_second']:
+                ratio = result['rows_per_second'] / base['rows_per_second']
+                comparison = f'{ratio:.2f}x'
+                if ratio < 1 - threshold:
+                    comparison += ' !'
+                    regressions.append(f'{n_rows}/{key}')
+            print(f'{key:40} {result["wall_time"]:>10.3f} {result["rows_per_second"]:>12} {peak_memory:>9} {comparison:>12}')
+    return regressions
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the ETL pipeline on synthetic data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='rows per source file (one run each)')
+    parser.add_argument('--database', choices=['auto', 'postgres', 'sqlite'], default='auto')
+    parser.add_argument('--baseline', default=settings.benchmark_baseline_path, help='baseline .json file')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='throughput drop reported as regression')
+    parser.add_argument('--trace-memory', action='store_true', help='record peak memory (slower)')
+    parser.add_argument('--normalize', action='store_true', help='only benchmark the normalization of the source values')
+    args = parser.parse_args()
+
+    settings.trace_memory = args.trace_memory
+    settings.profile_cpu = False
+    results = {}
+    with tempfile.TemporaryDirectory() as work_path:
+        logger.setup(filename=os.path.join(work_path, 'benchmark.log'))
+        for n_rows in args.rows:
+            if args.normalize:
+                results[str(n_rows)] = run_normalize(n_rows, work_path)
+            else:
+                results[str(n_rows)] = run(n_rows, args.database, work_path)
+    #Compare with the baseline
+    baseline = challenge.load_json_file(args.baseline)
+    regressions = compare(results, baseline, args.threshold)
+    if args.save_baseline:
+        challenge.save_json_file({**baseline, **{n_rows: {**baseline.get(n_rows, {}), **stages}
+            for n_rows, stages in results.items()}}, args.baseline)
+        print(f'\nBaseline saved on "{args.baseline}"')
+    if regressions:
+        print(f'\nRegressions: {", ".join(regressions)}')
+        sys.exit(1)
+
+#This is called when benchmark.py is run directly
+if __name__ == "__main__":
+    main()
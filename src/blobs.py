@@ -0,0 +1,177 @@
+"""
+    This module manages a content-addressed store of downloaded source files.
+    Each distinct content is saved once, compressed (gzip, or zstd if the optional
+    zstandard package is installed), in a blob named after its sha256 hash.
+    The dated source file paths become small reference files ('<file path>.ref')
+    pointing to its blob, so a source that doesn't change takes no extra space.
+"""
+
+#Imports
+#Files
+import os
+import gzip
+import json
+import shutil
+import importlib.util
+from pathlib import Path
+#Settings module
+import settings
+#Logger module
+import logger
+
+#File extensions of the blobs by compression (pandas infers the compression from them)
+extensions = {
+    "gzip" : ".csv.gz",
+    "zstd" : ".csv.zst"
+}
+
+#Methods
+def is_enabled():
+    """
+    Check if downloaded files are saved on the store (it needs a store path in settings).
+
+    Returns:
+        bool: True if the store is used. False otherwise.
+    """
+    return bool(settings.blob_store_path)
+
+def get_compression():
+    """
+    Get the compression of new blobs, from settings.blob_compression. zstd needs the
+    zstandard package (optional dependency), gzip is used if it's not installed.
+
+    Returns:
+        str: 'gzip' or 'zstd'.
+    """
+    if settings.blob_compression == 'zstd' and importlib.util.find_spec('zstandard'):
+        return 'zstd'
+    return 'gzip'
+
+def get_blob_path(sha256, compression=None, store_path=None):
+    """
+    Get the path of the blob of a content.
+
+    Args:
+        sha256 (str): Hexadecimal sha256 hash of the content.
+        compression (str, optional): 'gzip' or 'zstd'. Defaults to get_compression().
+        store_path (str, optional): Store folder. Defaults to settings.blob_store_path.
+
+    Returns:
+        str: Blob path ('<store path>/<first 2 hash chars>/<hash><extension>').
+    """
+    extension = extensions[compression or get_compression()]
+    return str(Path(store_path or settings.blob_store_path) / sha256[:2] / f'{sha256}{extension}')
+
+def find_blob(sha256, store_path=None):
+    """
+    Look for the blob of a content, with any compression.
+
+    Args:
+        sha256 (str): Hexadecimal sha256 hash of the content.
+        store_path (str, optional): Store folder. Defaults to settings.blob_store_path.
+
+    Returns:
+        str: Blob path. None if the content is not on the store.
+    """
+    for compression in extensions.keys():
+        blob_path = get_blob_path(sha256, compression, store_path)
+        if os.path.exists(blob_path):
+            return blob_path
+    return None
+
+def compress_file(file_path, blob_path, compression):
+    """
+    Write a compressed copy of a file. It's written to a temporary file and renamed
+    when complete, so incomplete blobs are never read.
+
+    Args:
+        file_path (str): Path to the file.
+        blob_path (str): Path to the compressed file.
+        compression (str): 'gzip' or 'zstd'.
+    """
+    Path(blob_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = blob_path + '.tmp'
+    with open(file_path, 'rb') as src:
+        if compression == 'zstd':
+            import zstandard
+            with open(tmp_path, 'wb') as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+        else:
+            #(mtime=0, so the same content always gives the same blob)
+            with gzip.GzipFile(tmp_path, 'wb', mtime=0) as dst:
+                shutil.copyfileobj(src, dst, settings.download_chunk_size)
+    os.replace(tmp_path, blob_path)
+
+def save_reference(file_path, sha256, blob_path):
+    """
+    Save the reference file of a dated source file path.
+
+    Args:
+        file_path (str): Source file path.
+        sha256 (str): Hexadecimal sha256 hash of its content.
+        blob_path (str): Path of its blob.
+    """
+    with open(file_path + '.ref', 'w', encoding='utf_8') as file:
+        json.dump({'sha256': sha256, 'blob': os.path.basename(blob_path)}, file)
+
+def store(file_path, sha256):
+    """
+    Move a file to the store: compress it into its blob (only if its content is not stored
+    yet), replace it by a reference file, and remove it.
+
+    Args:
+        file_path (str): Path to the file.
+        sha256 (str): Hexadecimal sha256 hash of its content.
+
+    Returns:
+        str: Path of its blob.
+    """
+    blob_path = find_blob(sha256)
+    if blob_path:
+        logger.log('INFO', f'Content of "{file_path}" already stored on "{blob_path}"')
+    else:
+        blob_path = get_blob_path(sha256)
+        compress_file(file_path, blob_path, get_compression())
+        logger.log('INFO', f'Stored "{file_path}" on "{blob_path}" '
+            f'({os.path.getsize(file_path)} bytes compressed to {os.path.getsize(blob_path)} bytes)')
+    save_reference(file_path, sha256, blob_path)
+    os.remove(file_path)
+    return blob_path
+
+def link(file_path, sha256):
+    """
+    Make a source file path reference an already stored content.
+
+    Args:
+        file_path (str): Source file path.
+        sha256 (str): Hexadecimal sha256 hash of the content.
+
+    Returns:
+        bool: True if the content is on the store. False otherwise (no reference is saved).
+    """
+    blob_path = find_blob(sha256)
+    if not blob_path:
+        return False
+    save_reference(file_path, sha256, blob_path)
+    return True
+
+def resolve(file_path):
+    """
+    Get the path where the content of a source file can be read: the file itself if it
+    exists, or the blob its reference file points to.
+
+    Args:
+        file_path (str): Source file path.
+
+    Returns:
+        str: Path to read (the same 'file_path' if it's not a reference, even if it doesn't exist).
+    """
+    if os.path.exists(file_path) or not os.path.exists(file_path + '.ref'):
+        return file_path
+    try:
+        with open(file_path + '.ref', 'r', encoding='utf_8') as file:
+            reference = json.load(file)
+    except Exception as e:
+        logger.log('ERROR', f'Failed to read reference "{file_path}.ref"', str(e))
+        return file_path
+    return find_blob(reference['sha256']) or file_path
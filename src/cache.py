@@ -0,0 +1,163 @@
+"""
+    This module manages a Parquet cache of processed data.
+    Each entry is a folder named after a key (a fingerprint of the source files, the version
+    of the code that transformed them and the settings that change its output), with one
+    .parquet file per table.
+    Old entries are evicted by age and by the total size of the cache.
+"""
+
+#Imports
+#Files
+import os
+import json
+import shutil
+import hashlib
+import time
+import importlib.util
+from pathlib import Path
+#Data manipulation
+import pandas as pd
+#Settings module
+import settings
+#Logger module
+import logger
+
+#Methods
+def is_enabled():
+    """
+    Check if the cache can be used: it needs a cache path in settings and
+    pyarrow installed (used to read and write .parquet files, see requirements.txt).
+
+    Returns:
+        bool: True if the cache can be used. False otherwise.
+    """
+    if not settings.processed_cache_path:
+        return False
+    if importlib.util.find_spec('pyarrow') is None:
+        logger.log('WARNING', 'Processed data cache disabled: pyarrow is not installed.')
+        return False
+    return True
+
+def get_file_hash(file_path, chunk_size=None):
+    """
+    Get the sha256 hash of a file, reading it by chunks.
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int, optional): Size in bytes of the chunks. Defaults to settings.download_chunk_size.
+
+    Returns:
+        str: Hexadecimal hash of the file content.
+    """
+    chunk_size = chunk_size or settings.download_chunk_size
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def get_cache_key(file_paths, version, options=None):
+    """
+    Get the cache key of some input files: a hash of their contents, the version of
+    the code that transforms them and the settings that change its output.
+
+    Args:
+        file_paths (list): Paths to the input files, in order.
+        version (int): Version of the transformation code.
+        options (dict, optional): Settings that change the output of the transformation,
+            by name (like {'compact_dtypes': True}). Defaults to None (no settings).
+
+    Returns:
+        str: Hexadecimal cache key.
+    """
+    sha256 = hashlib.sha256(f'version={version}'.encode())
+    if options:
+        sha256.update(json.dumps(options, sort_keys=True).encode())
+    for file_path in file_paths:
+        sha256.update(get_file_hash(file_path).encode())
+    return sha256.hexdigest()
+
+def load(key, cache_path=None):
+    """
+    Load the tables saved on the cache with a given key.
+
+    Args:
+        key (str): Cache key.
+        cache_path (str, optional): Cache folder. Defaults to settings.processed_cache_path.
+
+    Returns:
+        dict: Table names as keys and DataFrames as values. None if there is no such entry.
+    """
+    cache_path = cache_path or settings.processed_cache_path
+    entry_path = Path(cache_path) / key
+    if not entry_path.is_dir():
+        return None
+    try:
+        #Table names (and its order) are saved on an index file
+        table_names = (entry_path / 'tables.txt').read_text(encoding='utf_8').split()
+        data = {name: pd.read_parquet(entry_path / f'{name}.parquet') for name in table_names}
+    except Exception as e:
+        logger.log('ERROR', f'Failed to load cache entry "{entry_path}"', str(e))
+        return None
+    #Mark the entry as recently used
+    os.utime(entry_path)
+    logger.log('INFO', f'Loaded processed data from cache entry "{entry_path}"')
+    return data
+
+def save(key, data, cache_path=None):
+    """
+    Save tables on the cache with a given key, and evict old entries.
+
+    Args:
+        key (str): Cache key.
+        data (dict): Table names as keys and DataFrames as values.
+        cache_path (str, optional): Cache folder. Defaults to settings.processed_cache_path.
+    """
+    cache_path = cache_path or settings.processed_cache_path
+    entry_path = Path(cache_path) / key
+    try:
+        entry_path.mkdir(parents=True, exist_ok=True)
+        for name, df in data.items():
+            df.to_parquet(entry_path / f'{name}.parquet', index=False)
+        #The index file is written last, so incomplete entries are never loaded
+        (entry_path / 'tables.txt').write_text('\n'.join(data.keys()), encoding='utf_8')
+        logger.log('INFO', f'Saved processed data on cache entry "{entry_path}"')
+    except Exception as e:
+        logger.log('ERROR', f'Failed to save cache entry "{entry_path}"', str(e))
+        shutil.rmtree(entry_path, ignore_errors=True)
+    evict(cache_path, keep=key)
+
+def evict(cache_path=None, max_size_mb=None, max_age_days=None, keep=None):
+    """
+    Remove cache entries older than 'max_age_days', and then the least recently used ones
+    until the cache size is under 'max_size_mb'.
+
+    Args:
+        cache_path (str, optional): Cache folder. Defaults to settings.processed_cache_path.
+        max_size_mb (int, optional): Maximum cache size in MB. Defaults to settings.processed_cache_max_size.
+        max_age_days (int, optional): Maximum age of an entry in days. Defaults to settings.processed_cache_max_age.
+        keep (str, optional): Key of an entry that is never removed. Defaults to None.
+    """
+    cache_path = cache_path or settings.processed_cache_path
+    if max_size_mb is None:
+        max_size_mb = settings.processed_cache_max_size
+    if max_age_days is None:
+        max_age_days = settings.processed_cache_max_age
+    if not Path(cache_path).is_dir():
+        return
+    #Entries with its last use time and size, least recently used first
+    entries = []
+    for entry_path in Path(cache_path).iterdir():
+        if entry_path.is_dir():
+            size = sum(file.stat().st_size for file in entry_path.iterdir())
+            entries.append((entry_path.stat().st_mtime, size, entry_path))
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    min_mtime = time.time() - max_age_days * 24 * 60 * 60
+    for mtime, size, entry_path in entries:
+        if entry_path.name == keep:
+            continue
+        if mtime < min_mtime or total_size > max_size_mb * 1024 * 1024:
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
+            logger.log('INFO', f'Evicted cache entry "{entry_path}"')
@@ -13,16 +13,33 @@
 #Data manipulation
 import pandas as pd
 import numpy as np
-import csv
 import datetime as dt
+import time
+import random
 #Requests
 import requests
 from pathlib import Path
 import os
+import shutil
+import hashlib
+import json
+import pickle
+import importlib.util
+import itertools
+#Concurrency
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 #Database connection
 import psql
 #Logging module
 import logger
+#Processed data cache module
+import cache
+#Downloaded files store module
+import blobs
+#Metrics module
+import metrics
 #Settings module
 import settings
 
@@ -41,12 +58,54 @@ url_museos = settings.url_museos
 url_salas_cine = settings.url_salas_cine
 url_bibliotecas = settings.url_bibliotecas
 
-#Sources info
-sources = {
-    "museos" : url_museos,
-    "salas_cine" : url_salas_cine,
-    "bibliotecas" : url_bibliotecas
+#Sources registry. For each source:
+# - url: where its csv file is downloaded from.
+# - columns: columns taken from its csv file (in the same order as 'source_column_names').
+# - extra_columns (optional): other columns taken from its csv file, with the name and dtype
+#   they have on espacios_culturales ('true_values' turns a column into booleans).
+source_registry = {
+    "museos" : {
+        "url" : url_museos,
+        "columns" : [
+            "Cod_Loc", "IdProvincia", "IdDepartamento", "categoria", "provincia", "localidad",
+            "nombre", "direccion", "CP", "cod_area", "telefono", "Mail", "Web", "fuente"]
+    },
+    "salas_cine" : {
+        "url" : url_salas_cine,
+        "columns" : [
+            "Cod_Loc", "IdProvincia", "IdDepartamento", "Categoría", "Provincia", "Localidad",
+            "Nombre", "Dirección", "CP", "cod_area", "Teléfono", "Mail", "Web", "Fuente"],
+        "extra_columns" : {
+            "Pantallas" : {"name" : "pantallas", "dtype" : "Int64"},
+            "Butacas" : {"name" : "butacas", "dtype" : "Int64"},
+            "espacio_INCAA" : {"name" : "espacio_incaa", "dtype" : "bool", "true_values" : ["Si", "SI"]}}
+    },
+    "bibliotecas" : {
+        "url" : url_bibliotecas,
+        "columns" : [
+            "Cod_Loc", "IdProvincia", "IdDepartamento", "Categoría", "Provincia", "Localidad",
+            "Nombre", "Domicilio", "CP", "Cod_tel", "Teléfono", "Mail", "Web", "Fuente"]
+    }
 }
+#Appropiate names of the source columns
+source_column_names = [
+    "id_localidad", "id_provincia", "id_departamento", "categoria", "provincia",
+    "localidad", "nombre", "domicilio", "cp", "cod_area", "telefono", "mail", "web", "fuente"
+]
+
+#Columns that identify an espacio cultural (its natural key), used to keep its id between runs
+#(see get_row_ids)
+row_key_columns = ["categoria", "id_localidad", "nombre", "domicilio"]
+
+#Sources info
+sources = {name : source["url"] for name, source in source_registry.items()}
+
+#Sources whose content changed on the last download (source names as keys, bool as values)
+changed_sources = {}
+
+#Version of the transformation code (part of the processed data cache key).
+#Increase it when a change in process_data alters its output
+transform_version = 4
 
 #Processed data
 processed_data = {}
@@ -80,29 +139,217 @@ def validate_file_paths(path_list):
         return False
     return True
 
-def save_csv_from_url(url, file_path):
+def validate_settings_paths():
+    """
+    Validate the file paths set on .env file (see validate_file_paths), printing
+    a message if they are not valid (the caller quits then).
+
+    Returns:
+        bool: True if all file paths are valid. False otherwise.
+    """
+    valid_paths = validate_file_paths([
+        settings.default_data_path,
+        settings.default_log_path,
+        settings.default_sql_path,
+        settings.metrics_path,
+        settings.profile_path])
+    if not valid_paths:
+        print("Please check your path files on .env file. Quitting program...")
+    return valid_paths
+
+def load_json_file(file_path):
+    """
+    Load a .json file used to persist metadata between runs (like the fetch cache).
+
+    Args:
+        file_path (str): Path to the .json file.
+
+    Returns:
+        dict: The loaded data. Empty if the file doesn't exist or can't be read.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf_8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_json_file(data, file_path):
+    """
+    Save a .json file used to persist metadata between runs (like the fetch cache).
+
+    Args:
+        data (dict): Data to save.
+        file_path (str): Path to the .json file.
+    """
+    #Ensure the directory exists
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, 'w', encoding='utf_8') as file:
+        json.dump(data, file, indent=4, ensure_ascii=False)
+
+class IncompleteDownloadError(Exception):
+    """
+    Raised when a download ends before the whole file was received.
+    """
+
+def is_retryable(e):
     """
-    Get a csv file from a given url and saves it to a local path
+    Check if a failed download is worth retrying: connection errors, timeouts, truncated
+    transfers, and server errors (5xx and 429 Too Many Requests).
+
+    Args:
+        e (Exception): Exception raised by the download.
+
+    Returns:
+        bool: True if the download can be retried. False otherwise.
+    """
+    if isinstance(e, requests.exceptions.HTTPError):
+        return e.response is not None and (e.response.status_code >= 500 or e.response.status_code == 429)
+    return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError, IncompleteDownloadError))
+
+def get_backoff_delay(attempt, base=settings.download_backoff, max_delay=settings.download_max_backoff):
+    """
+    Get the seconds to wait before retrying a download: exponential backoff with full jitter
+    (a random delay up to base * 2^attempt), so concurrent retries don't hit the server at once.
+
+    Args:
+        attempt (int): Number of the failed attempt (from 0).
+        base (float, optional): Base delay in seconds. Defaults to settings.download_backoff.
+        max_delay (float, optional): Maximum delay in seconds. Defaults to settings.download_max_backoff.
+
+    Returns:
+        float: Seconds to wait.
+    """
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+def save_csv_from_url(url, file_path, cache_entry=None, chunk_size=settings.download_chunk_size,
+                      retries=settings.download_retries,
+                      timeout=(settings.download_connect_timeout, settings.download_read_timeout)):
+    """
+    Get a csv file from a given url and saves it to a local path, as is (byte by byte).
+    If 'cache_entry' has validators (ETag / Last-Modified) from a previous download, the
+    request is conditional and the body is skipped when the server answers 304 Not Modified.
+    Otherwise the content hash is compared with the previous one to tell if it changed.
+    The file is downloaded to a temporary '.part' file, renamed when complete, so an interrupted
+    download never leaves a truncated csv file. Failed downloads are retried with jittered
+    exponential backoff, resuming from the bytes already received (see download_file).
 
     Args:
         url (string): Url from where the csv file can be downloaded
         file_path (string): File path to save the csv file locally
+        cache_entry (dict, optional): Fetch metadata of the previous download. Defaults to None.
+        chunk_size (int, optional): Size in bytes of the chunks streamed to disk.
+            Defaults to settings.download_chunk_size.
+        retries (int, optional): Maximum number of retries. Defaults to settings.download_retries.
+        timeout (tuple, optional): Connect and read timeouts in seconds.
+            Defaults to (settings.download_connect_timeout, settings.download_read_timeout).
+
+    Returns:
+        dict: Fetch metadata of this download ('url', 'file_path', 'etag', 'last_modified',
+            'sha256', 'bytes' and 'changed')
     """
-    
+    cache_entry = cache_entry or {}
     #Ensure the directory(folder) exists, if not, it creates it
     folder_path = file_path.split('\\')[0:-1]
     folder_path = ('\\').join(folder_path)
     Path(folder_path).mkdir(parents=True, exist_ok=True)
+    for attempt in range(retries + 1):
+        try:
+            return download_file(url, file_path, cache_entry, chunk_size, timeout)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = get_backoff_delay(attempt)
+            logger.log('WARNING', f'Download of "{url}" failed, retrying in {delay:.1f} seconds '
+                f'({attempt + 1} of {retries} retries)', str(e))
+            time.sleep(delay)
+
+def download_file(url, file_path, cache_entry, chunk_size, timeout):
+    """
+    Make a single attempt to download a file (see save_csv_from_url).
+    The content is appended to '<file_path>.part'. If that file is there from an interrupted
+    attempt, only the remaining bytes are requested (Range request), as long as the file on the
+    server is the same (If-Range with the validators saved on '<file_path>.part.json').
+
+    Args:
+        url (string): Url from where the file can be downloaded.
+        file_path (string): File path to save the file locally.
+        cache_entry (dict): Fetch metadata of the previous download (empty dict if there is not).
+        chunk_size (int): Size in bytes of the chunks streamed to disk.
+        timeout (tuple): Connect and read timeouts in seconds.
+
+    Raises:
+        IncompleteDownloadError: If the connection was closed before the whole file was received.
+
+    Returns:
+        dict: Fetch metadata of this download (like save_csv_from_url).
+    """
+    part_path = file_path + '.part'
+    part_info_path = part_path + '.json'
+    headers = {}
+    #Resume a partial download of the same url
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    part_info = load_json_file(part_info_path) if resume_from else {}
+    if resume_from and part_info.get('url') == url:
+        #(byte ranges are asked over the uncompressed content, the one written to disk)
+        headers['Range'] = f'bytes={resume_from}-'
+        headers['Accept-Encoding'] = 'identity'
+        if part_info.get('etag') or part_info.get('last_modified'):
+            headers['If-Range'] = part_info.get('etag') or part_info.get('last_modified')
+    else:
+        resume_from = 0
+        #Conditional request headers, only if the previous file is still there
+        if cache_entry.get('url') == url and os.path.exists(blobs.resolve(cache_entry.get('file_path', ''))):
+            if cache_entry.get('etag'):
+                headers['If-None-Match'] = cache_entry['etag']
+            if cache_entry.get('last_modified'):
+                headers['If-Modified-Since'] = cache_entry['last_modified']
     #Make the request
-    with requests.get(url, stream=True) as r:
-        #Get the decoded lines of the csv file
-        lines = (line.decode('utf-8') for line in r.iter_lines())
-    
-        #Create (or overwrite if exists) the file in the file_path path
-        with open(file_path, 'w', encoding='UTF8', newline='') as f:
-            #Write each row in the file
-            writer = csv.writer(f)
-            writer.writerows(csv.reader(lines))
+    with requests.get(url, stream=True, headers=headers, timeout=timeout) as r:
+        #Not modified: reuse the previous file, without downloading the body
+        if r.status_code == 304:
+            #(a reference to its blob if the previous content is on the store, otherwise a copy)
+            if cache_entry['file_path'] != file_path and not blobs.link(file_path, cache_entry['sha256']):
+                shutil.copyfile(blobs.resolve(cache_entry['file_path']), file_path)
+            return {**cache_entry, 'file_path': file_path, 'bytes': 0, 'changed': False}
+        #The partial download can't be resumed: start over on the next attempt
+        if r.status_code == 416:
+            os.remove(part_path)
+            raise IncompleteDownloadError(f'Partial download of "{url}" can\'t be resumed')
+        r.raise_for_status()
+        #Partial content is appended to the partial download, otherwise the file is downloaded again
+        if r.status_code != 206:
+            resume_from = 0
+        etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+        save_json_file({'url': url, 'etag': etag, 'last_modified': last_modified}, part_info_path)
+        #Hash the content while streaming the raw bytes straight to disk
+        #(decoding and csv parsing is done once, when the file is read by pandas)
+        sha256 = hashlib.sha256()
+        n_bytes = resume_from
+        if resume_from:
+            with open(part_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    sha256.update(chunk)
+        with open(part_path, 'ab' if resume_from else 'wb', buffering=chunk_size) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                sha256.update(chunk)
+                n_bytes += f.write(chunk)
+        #Check the whole body was received (Content-Length counts the bytes on the wire)
+        if 'Content-Length' in r.headers and r.raw.tell() < int(r.headers['Content-Length']):
+            raise IncompleteDownloadError(f'Connection closed after {n_bytes} bytes of "{url}"')
+    #Complete: replace the csv file at once
+    os.replace(part_path, file_path)
+    os.remove(part_info_path)
+    #Return the metadata of the download
+    return {
+        'url': url,
+        'file_path': file_path,
+        'etag': etag,
+        'last_modified': last_modified,
+        'sha256': sha256.hexdigest(),
+        'bytes': n_bytes,
+        'changed': sha256.hexdigest() != cache_entry.get('sha256')
+    }
 
 def get_month_name(month_number):
     """
@@ -129,40 +376,610 @@ def get_month_name(month_number):
                     12 : "Diciembre"}
     return month_dict[month_number]
 
-def get_source_files(sources):
+def get_source_file_path(name, base_path=None):
     """
-    Try to make requests to urls from sources dictionary, download those files, and save it
-    locally following a structure.
+    Build the path where the csv file of a source is saved for the current date, following
+    the structure: data_path\\name\\year-month_name\\name-day-month-year.csv
 
     Args:
-        sources (dict): Dictionary with source names as keys (used to build the filename)
-            and urls as values.
+        name (str): Source name.
+        base_path (str, optional): Path prepended to the file path. Defaults to None (relative path).
 
     Returns:
-        bool: True if no exceptions occurred. False otherwise.
+        str: File path of the source csv file.
+    """
+    #File path structure
+    file_path = '{data_path}\{name}\{year}-{month_name}\{name}-{day}-{month}-{year}.csv'.format(
+        data_path=settings.default_data_path, name=name, year=now.year,
+        month_name=get_month_name(now.month).lower(), day=now.day, month=now.month
+    )
+    #Prepend the base path if given
+    if base_path:
+        file_path = base_path + '\\' + file_path
+    return file_path
+
+def get_source_file(name, url, cache_entry=None):
+    """
+    Try to make a request to a source url, download that file, and save it locally
+    following a structure. Failures are logged and don't affect other sources.
+
+    Args:
+        name (str): Source name (used to build the filename).
+        url (str): Url from where the source file can be downloaded.
+        cache_entry (dict, optional): Fetch metadata of the previous download. Defaults to None.
+
+    Returns:
+        dict: Fetch metadata of the download. None if an exception occurred.
     """
-    #Iterate the sources
-    for name, url in sources.items():
-        #File path structure
-        file_path = cwd + '\{data_path}\{name}\{year}-{month_name}\{name}-{day}-{month}-{year}.csv'.format(
-            data_path=settings.default_data_path, name=name, year=now.year,
-            month_name=get_month_name(now.month).lower(), day=now.day, month=now.month
-        )
+    #File path structure
+    file_path = get_source_file_path(name, cwd)
+    #Record the metrics of the download
+    with metrics.stage('fetch', source=name) as record:
         #Catch possible exceptions making directories, requesting urls or writing csv's
         try:
-            #Save the csv file in that directory
-            save_csv_from_url(url, file_path)
+            #Save the csv file in that directory, timing the download
+            start = time.perf_counter()
+            fetch_info = save_csv_from_url(url, file_path, cache_entry)
+            #Move the file to the content-addressed store (if enabled on .env file)
+            if blobs.is_enabled() and os.path.exists(file_path):
+                blobs.store(file_path, fetch_info['sha256'])
+            elapsed = time.perf_counter() - start
+            record.update(bytes=fetch_info['bytes'], changed=fetch_info['changed'])
             #Log
-            logger.log('INFO', f'Created "{file_path}" successfully')
+            if fetch_info['changed']:
+                logger.log('INFO', f'Created "{file_path}" successfully ({fetch_info["bytes"]} bytes in {elapsed:.2f} seconds)')
+            else:
+                logger.log('INFO', f'Source "{name}" not modified since last download ({elapsed:.2f} seconds)')
         #Log possible exceptions
         except requests.exceptions.InvalidSchema as e:
             logger.log('ERROR', f'Failed to request url "{url}"', str(e))
-            return False
+            record['error'] = str(e)
+            return None
         except Exception as e:
             logger.log('ERROR', f'Failed to create "{file_path}"', str(e))
-            return False
+            record['error'] = str(e)
+            return None
     #If no exceptions
-    return True
+    return fetch_info
+
+def get_source_files(sources, max_workers=settings.download_workers):
+    """
+    Try to make requests to urls from sources dictionary, download those files, and save it
+    locally following a structure.
+    Downloads run concurrently, each one on its own thread, and are conditional on the
+    fetch metadata cache. Sources whose content changed are stored in 'changed_sources'.
+
+    Args:
+        sources (dict): Dictionary with source names as keys (used to build the filename)
+            and urls as values.
+        max_workers (int, optional): Maximum number of concurrent downloads.
+            Defaults to settings.download_workers.
+
+    Returns:
+        bool: True if no exceptions occurred. False otherwise.
+    """
+    #Load the metadata of previous downloads
+    fetch_cache = load_json_file(settings.fetch_cache_path)
+    cache_entries = [fetch_cache.get(name) for name in sources.keys()]
+    #Download every source at the same time (up to max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(get_source_file, sources.keys(), sources.values(), cache_entries))
+    #Remember which sources changed, and update the cache with the successful downloads
+    save_fetch_results(fetch_cache, dict(zip(sources.keys(), results)))
+    #True only if all the sources were downloaded
+    return all(results)
+
+def save_fetch_results(fetch_cache, results):
+    """
+    Store which sources changed on a fetch (in 'changed_sources') and save the metadata of
+    the successful downloads on the fetch metadata cache. If any source changed, the load
+    stamp (settings.load_stamp_path) is removed, as the loaded data is outdated.
+
+    Args:
+        fetch_cache (dict): Fetch metadata cache, as loaded before the downloads. Updated in place.
+        results (dict): Source names as keys, and its fetch info (see get_source_file) as
+            values (None if the download failed).
+    """
+    changed_sources.clear()
+    for name, fetch_info in results.items():
+        if fetch_info:
+            changed_sources[name] = fetch_info.pop('changed')
+            fetch_info.pop('bytes')
+            fetch_cache[name] = fetch_info
+    save_json_file(fetch_cache, settings.fetch_cache_path)
+    #The loaded data is outdated if any source changed
+    if any(changed_sources.values()):
+        Path(settings.load_stamp_path).unlink(missing_ok=True)
+
+def sources_changed():
+    """
+    Check if the database has to be updated after fetching the source files: a source changed
+    on the last fetch (see 'changed_sources'), or the last load didn't finish (its stamp,
+    settings.load_stamp_path, is removed when a source changes and saved when a load finishes).
+
+    Returns:
+        bool: True if the source files have to be processed and loaded. False otherwise.
+    """
+    return any(changed_sources.values()) or not os.path.exists(settings.load_stamp_path)
+
+def normalize_dataframe(df):
+    """
+    Set the correct column types of a filtered (and renamed) source dataframe and normalize its
+    values, using vectorized operations. Null values are kept as real nulls.
+
+    Args:
+        df (DataFrame): Source dataframe, with the espacios_culturales column names.
+
+    Returns:
+        DataFrame: The same dataframe, normalized in place.
+    """
+    #Set correct column types
+    #Numeric columns
+    for col in df.columns[0:3]:
+        df[col] = pd.to_numeric(df[col])
+    #String columns (only not null values are casted, and only if they are not strings already)
+    for col in df.columns[3:-1]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) != 'string':
+            df[col] = df[col].astype(str).where(df[col].notna())
+    #Delete decimals on not null cod_area values
+    #(on its unique values only, as there are few area codes, and mapped back to the rows)
+    codes, uniques = pd.factorize(df["cod_area"])
+    df["cod_area"] = pd.Series(pd.Index(uniques).str.split('.', n=1).str[0].take(
+        codes, allow_fill=True, fill_value=np.nan), index=df.index)
+    #Replace "s/d" and "nan" by null values
+    for col in ["cod_area", "telefono", "mail", "web"]:
+        df[col] = df[col].mask(df[col].isin(['s/d', 'nan']))
+    #Modify the column "telefono" to include "cod_area"
+    df["telefono"] = '(' + df["cod_area"] + ') ' + df["telefono"]
+    #Drop "cod_area" column
+    df.drop("cod_area", axis=1, inplace=True)
+    return df
+
+def get_dimension_table(df, id_col, value_col):
+    """
+    Build a dimension table from columns that already have its own ids in the source data
+    (like 'id_provincia' and 'provincia'), in a single hash-based grouping pass.
+
+    Args:
+        df (DataFrame): Dataframe containing both columns.
+        id_col (str): Name of the id column.
+        value_col (str): Name of the value column.
+
+    Returns:
+        DataFrame: Dimension table with 'id_col' and 'value_col' columns, one row per id.
+    """
+    return df.groupby(id_col, as_index=False)[value_col].max()
+
+def get_ids(values, mapping):
+    """
+    Get the ids of some unique values from 'mapping', so the same value keeps its id between runs.
+    New values are added to 'mapping' with the next free ids (in the order they are given).
+
+    Args:
+        values (iterable): Unique values.
+        mapping (dict): Values as keys and its ids as values. Updated in place.
+
+    Returns:
+        ndarray: Ids of the values (int64), in the same order.
+    """
+    next_id = max(mapping.values(), default=-1) + 1
+    for value in values:
+        if value not in mapping:
+            mapping[value] = next_id
+            next_id += 1
+    return np.array([mapping[value] for value in values], dtype='int64')
+
+def get_row_keys(df):
+    """
+    Hash the natural key (see 'row_key_columns') of each row of an espacios_culturales dataframe
+    (or a chunk of it), in a single vectorized pass.
+
+    Args:
+        df (DataFrame): espacios_culturales dataframe, with the 'row_key_columns' columns.
+
+    Returns:
+        ndarray: Hash of the natural key of each row (uint64), in the same order.
+    """
+    #(id_localidad as an integer, so it's hashed the same in every chunk)
+    df_keys = pd.DataFrame({col: df[col] for col in row_key_columns})
+    df_keys["id_localidad"] = df_keys["id_localidad"].fillna(-1).astype('int64')
+    return pd.util.hash_pandas_object(df_keys, index=False).to_numpy()
+
+def get_occurrence_keys(keys, occurrences):
+    """
+    Combine the natural key hashes of some rows with its occurrence numbers (which tell apart
+    the rows with the same natural key) into a single hash.
+
+    Args:
+        keys (ndarray): Natural key hashes (see get_row_keys).
+        occurrences (ndarray): Occurrence numbers.
+
+    Returns:
+        ndarray: Combined hashes (uint64).
+    """
+    #(the first occurrence keeps the natural key hash, the next ones add a multiple of a large odd constant)
+    return keys + occurrences.astype('uint64') * np.uint64(0x9E3779B97F4A7C15)
+
+def load_row_ids(file_path=None):
+    """
+    Load the ids given to espacios culturales on previous runs (saved by save_row_ids),
+    ready to give ids to the rows of a new run (see get_row_ids).
+
+    Args:
+        file_path (str, optional): Path to the ids file. Defaults to settings.row_ids_path.
+
+    Returns:
+        dict: Row ids state: the saved natural key hashes, occurrence numbers and ids (looked up
+            by its combined hash), the saved ids given on this run, the next free id, and the
+            ids given to new rows on this run.
+    """
+    try:
+        saved = pd.read_pickle(file_path or settings.row_ids_path)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        saved = {"next_id" : 0, "ids" : pd.DataFrame({
+            "key" : np.array([], dtype='uint64'),
+            "occurrence" : np.array([], dtype='int64'),
+            "id" : np.array([], dtype='int64')})}
+    df_ids = saved["ids"]
+    return {
+        "index" : pd.Index(get_occurrence_keys(df_ids["key"].to_numpy(), df_ids["occurrence"].to_numpy())),
+        "keys" : df_ids["key"].to_numpy(),
+        "ids" : df_ids["id"].to_numpy(),
+        "used" : np.zeros(len(df_ids), dtype=bool),
+        "next_id" : saved["next_id"],
+        "new_keys" : [],
+        "new_ids" : []
+    }
+
+def get_row_ids(df, row_ids):
+    """
+    Get a stable id for each row of an espacios_culturales dataframe (or a chunk of it), from its
+    natural key (see 'row_key_columns'), so a row keeps its id between runs even if other rows
+    are added or removed. Rows with the same natural key are told apart by their order.
+    Rows not seen on previous runs get the next free ids. Everything is done with vectorized
+    lookups, so each chunk costs the same.
+
+    Args:
+        df (DataFrame): espacios_culturales dataframe, with the 'row_key_columns' columns.
+        row_ids (dict): Row ids state (see load_row_ids). Updated in place.
+
+    Returns:
+        ndarray: Ids of the rows (int64), in the same order.
+    """
+    keys = get_row_keys(df)
+    #Number of the row among the ones of the chunk with the same natural key
+    occurrences = pd.Series(keys).groupby(keys).cumcount().to_numpy()
+    #Look for the rows on the saved ids
+    positions = row_ids["index"].get_indexer(get_occurrence_keys(keys, occurrences))
+    #Rows whose saved id was given on a previous chunk (same natural key) take the next occurrence
+    taken = positions >= 0
+    taken[taken] = row_ids["used"][positions[taken]]
+    while taken.any():
+        shifted = np.isin(keys, keys[taken])
+        occurrences[shifted] += 1
+        positions[shifted] = row_ids["index"].get_indexer(get_occurrence_keys(keys[shifted], occurrences[shifted]))
+        taken = positions >= 0
+        taken[taken] = row_ids["used"][positions[taken]]
+    #Rows seen on previous runs keep its ids, new rows get the next free ids
+    ids = np.empty(len(keys), dtype='int64')
+    found = positions >= 0
+    ids[found] = row_ids["ids"][positions[found]]
+    row_ids["used"][positions[found]] = True
+    n_new = int((~found).sum())
+    ids[~found] = np.arange(row_ids["next_id"], row_ids["next_id"] + n_new)
+    row_ids["next_id"] += n_new
+    row_ids["new_keys"].append(keys[~found])
+    row_ids["new_ids"].append(ids[~found])
+    return ids
+
+def save_row_ids(row_ids, file_path=None):
+    """
+    Save the ids given to espacios culturales on this run, so they are kept on future runs.
+    Only the rows seen on this run are kept (and the next free id, so ids are never reused).
+
+    Args:
+        row_ids (dict): Row ids state (see load_row_ids).
+        file_path (str, optional): Path to the ids file. Defaults to settings.row_ids_path.
+    """
+    file_path = file_path or settings.row_ids_path
+    used = row_ids["used"]
+    df_ids = pd.DataFrame({
+        "key" : np.concatenate([row_ids["keys"][used], *row_ids["new_keys"]]),
+        "id" : np.concatenate([row_ids["ids"][used], *row_ids["new_ids"]])
+    }).sort_values(["key", "id"], ignore_index=True)
+    #Occurrence numbers by id order, so the rows with the same natural key keep its order
+    df_ids.insert(1, "occurrence", df_ids.groupby("key").cumcount())
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    pd.to_pickle({"next_id" : row_ids["next_id"], "ids" : df_ids}, file_path)
+
+def encode_dimension(values, id_col, mapping):
+    """
+    Dictionary-encode a column: build its dimension table and its foreign key column in one pass.
+    Ids are taken from 'mapping', so the same value keeps its id between runs.
+    New values are added to 'mapping' with the next free ids.
+
+    Args:
+        values (Series): Column to encode (like 'categoria').
+        id_col (str): Name of the id column (like 'id_categoria').
+        mapping (dict): Values as keys and its ids as values. Updated in place.
+
+    Returns:
+        tuple: The dimension table (DataFrame with 'id_col' and 'values.name' columns)
+            and the foreign key column (Series with the id of each value).
+    """
+    #Hash the values into codes (-1 for null values) and its unique values
+    codes, uniques = pd.factorize(values)
+    #Ids of the unique values, in the same order as the codes
+    unique_ids = get_ids(uniques, mapping)
+    #Build the dimension table
+    df_dimension = pd.DataFrame({id_col: unique_ids, values.name: uniques}).sort_values(id_col, ignore_index=True)
+    #Build the foreign key column (Int64 only if there are null values)
+    if (codes == -1).any():
+        foreign_keys = pd.Series(pd.array(unique_ids.take(codes), dtype='Int64'), index=values.index)
+        foreign_keys[codes == -1] = pd.NA
+    else:
+        foreign_keys = pd.Series(unique_ids.take(codes), index=values.index)
+    return df_dimension, foreign_keys
+
+def get_csv_engine():
+    """
+    Get the engine used by pandas to parse the csv files, from settings.csv_engine.
+    When it is 'auto', pyarrow is used if installed (it's an optional dependency).
+
+    Returns:
+        str: 'pyarrow', 'c' or 'python'.
+    """
+    if settings.csv_engine == 'auto':
+        return 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+    return settings.csv_engine
+
+def read_csv_pyarrow(file_path, usecols, dtype):
+    """
+    Read a csv file with pyarrow (optional dependency). The string columns are parsed as strings
+    by pyarrow itself: pandas 'dtype' argument is applied after the columns were parsed (numbers
+    like '4257744' become '4257744.0' and nulls become 'None'). The same values as on the 'c'
+    engine (like empty values) are read as nulls.
+
+    Args:
+        file_path (str): Path to the csv file (its compression is inferred from the extension).
+        usecols (list): Columns to parse.
+        dtype (dict): Column names as keys, and str as value for the string columns.
+
+    Returns:
+        DataFrame: The csv dataframe.
+    """
+    from pyarrow import csv
+    from pandas._libs.parsers import STR_NA_VALUES
+    convert_options = csv.ConvertOptions(
+        include_columns=usecols,
+        column_types={col: 'string' for col, col_dtype in dtype.items() if col_dtype is str},
+        null_values=sorted(STR_NA_VALUES),
+        strings_can_be_null=True)
+    return csv.read_csv(file_path, convert_options=convert_options).to_pandas()
+
+def read_source_csv(name, file_path, chunksize=None):
+    """
+    Read a source csv file, parsing only the columns used from that source, with its types
+    declared at read time. Logs the parse time and memory usage of the dataframe.
+
+    Args:
+        name (str): Source name (a key of 'sources' dictionary).
+        file_path (str): Path to the csv file.
+        chunksize (int, optional): If given, read the file in chunks of that many rows
+            (the 'c' engine is used, as pyarrow doesn't read by chunks). Defaults to None.
+
+    Returns:
+        DataFrame: The source dataframe. An iterator over its chunks if 'chunksize' is given.
+    """
+    source = source_registry[name]
+    extra_columns = source.get("extra_columns", {})
+    #Read the stored blob if the file is a reference (its compression is inferred from the extension)
+    file_path = blobs.resolve(file_path)
+    #Columns to parse
+    usecols = source["columns"] + list(extra_columns.keys())
+    #Every column but the id ones (first 3) and the numeric extra ones are strings
+    dtype = {col: str for col in source["columns"][3:]}
+    for col, extra_column in extra_columns.items():
+        if "true_values" in extra_column:
+            dtype[col] = str
+    #Read by chunks
+    if chunksize:
+        return pd.read_csv(file_path, encoding='utf-8', usecols=usecols, dtype=dtype, chunksize=chunksize)
+    #Read the whole file, measuring time and memory
+    engine = get_csv_engine()
+    start = time.perf_counter()
+    if engine == 'pyarrow':
+        df = read_csv_pyarrow(file_path, usecols, dtype)
+    else:
+        df = pd.read_csv(file_path, encoding='utf-8', usecols=usecols, dtype=dtype, engine=engine)
+    elapsed = time.perf_counter() - start
+    memory = df.memory_usage(deep=True).sum()
+    logger.log('INFO', f'Parsed "{file_path}" with {engine} engine ({len(df)} rows, {memory} bytes in memory, {elapsed:.2f} seconds)')
+    return df
+
+def get_source_dataframe(name, df):
+    """
+    Filter the relevant columns of a source dataframe (or a chunk of it), rename them with the
+    espacios_culturales column names and normalize its values.
+
+    Args:
+        name (str): Source name (a key of 'sources' dictionary).
+        df (DataFrame): Source dataframe, as read from its csv file.
+
+    Returns:
+        DataFrame: Filtered and normalized dataframe.
+    """
+    source = source_registry[name]
+    #Filter columns
+    filtered_df = df[source["columns"]]
+    #Rename the columns with appropiate names
+    filtered_df.columns = source_column_names
+    #Normalize its values
+    normalize_dataframe(filtered_df)
+    #Include the extra columns of the source
+    for col, extra_column in source.get("extra_columns", {}).items():
+        if "true_values" in extra_column:
+            #Boolean columns: True on 'true_values', False otherwise
+            filtered_df[extra_column["name"]] = df[col].isin(extra_column["true_values"])
+        else:
+            filtered_df[extra_column["name"]] = df[col]
+    return filtered_df
+
+def read_source_dataframe(name, file_path):
+    """
+    Read a source csv file and filter and normalize it (see read_source_csv and get_source_dataframe).
+    Used as the task of each process when processing the sources in parallel.
+
+    Args:
+        name (str): Source name (a key of 'sources' dictionary).
+        file_path (str): Path to the csv file.
+
+    Returns:
+        DataFrame: Filtered and normalized dataframe.
+    """
+    return get_source_dataframe(name, read_source_csv(name, file_path))
+
+def get_extra_columns():
+    """
+    Get the extra columns of all the sources (with its name and dtype on espacios_culturales).
+
+    Returns:
+        dict: espacios_culturales column names as keys, and the dtypes as values (in registry order).
+    """
+    extra_columns = {}
+    for source in source_registry.values():
+        for extra_column in source.get("extra_columns", {}).values():
+            extra_columns[extra_column["name"]] = extra_column["dtype"]
+    return extra_columns
+
+def set_espacios_culturales_dtypes(df):
+    """
+    Set correct dtypes on espacios_culturales dataframe columns that may come
+    from only some of the sources.
+
+    Args:
+        df (DataFrame): espacios_culturales dataframe (or a chunk of it).
+    """
+    #(Int64 is like built-in int but can store null values)
+    for col, dtype in get_extra_columns().items():
+        #Boolean columns are False on the sources that don't have them
+        if dtype == 'bool':
+            df[col] = df[col].fillna(False)
+        df[col] = df[col].astype(dtype)
+
+def get_summary_tables(df):
+    """
+    Build the summary tables queried by the dashboards from an espacios_culturales
+    dataframe (or a chunk of it), before its redundant columns are dropped:
+    the number of espacios culturales by categoria, by fuente and by provincia, and the
+    totals of the extra columns (like pantallas, butacas and espacio_incaa) by provincia.
+    Each table has the grouping column as its first column (primary key).
+
+    Args:
+        df (DataFrame): espacios_culturales dataframe, with 'categoria', 'fuente' and 'provincia' columns.
+
+    Returns:
+        dict: Dictionary with summary table names as keys, and DataFrames as values.
+    """
+    summaries = {}
+    for col in ["categoria", "fuente", "provincia"]:
+        summaries[f"cantidad_por_{col}"] = df.groupby(col).size().rename("cantidad").reset_index()
+    summaries["totales_por_provincia"] = df.groupby("provincia")[list(get_extra_columns().keys())].sum().reset_index()
+    return summaries
+
+def combine_summary_tables(summaries, new_summaries):
+    """
+    Add up the summary tables of different chunks (see get_summary_tables).
+
+    Args:
+        summaries (dict): Summary tables of the previous chunks (empty dict if there are not).
+        new_summaries (dict): Summary tables of a new chunk.
+
+    Returns:
+        dict: Dictionary with summary table names as keys, and DataFrames as values.
+    """
+    combined = {}
+    for table, df in new_summaries.items():
+        if table in summaries:
+            df = pd.concat([summaries[table], df]).groupby(df.columns[0], as_index=False).sum()
+        combined[table] = df
+    return combined
+
+def get_string_dtype():
+    """
+    Get the dtype used for string columns: Arrow-backed strings if pyarrow is
+    installed (it's an optional dependency), pandas nullable strings otherwise.
+
+    Returns:
+        str: 'string[pyarrow]' or 'string'.
+    """
+    return 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'string'
+
+def get_int_dtype(values, nullable=False):
+    """
+    Get the smallest integer dtype that fits some values.
+
+    Args:
+        values (Series): Integer values (nulls are ignored).
+        nullable (bool, optional): Return a pandas nullable dtype (like 'Int16'). Defaults to False.
+
+    Returns:
+        str: Integer dtype name (like 'int16' or 'Int16').
+    """
+    min_value, max_value = values.min(), values.max()
+    for dtype in ['int8', 'int16', 'int32']:
+        if pd.isna(min_value) or (np.iinfo(dtype).min <= min_value and max_value <= np.iinfo(dtype).max):
+            break
+    else:
+        dtype = 'int64'
+    return dtype.capitalize() if nullable else dtype
+
+def compact_dataframe(df, name, category_max_ratio=settings.category_max_ratio):
+    """
+    Reduce the memory used by a processed dataframe, in place: string columns with few
+    distinct values become categoricals, the other string columns become nullable (or
+    Arrow-backed) strings, and integer columns are downcast to the smallest type that fits.
+    Logs (and records as metrics) the memory used before and after.
+
+    Args:
+        df (DataFrame): Processed dataframe.
+        name (str): Table name (used on the log).
+        category_max_ratio (float, optional): Maximum ratio of distinct values to rows of a
+            categorical column. Defaults to settings.category_max_ratio.
+
+    Returns:
+        DataFrame: The same dataframe, compacted.
+    """
+    with metrics.stage('compact', table=name) as record:
+        memory_before = df.memory_usage(deep=True).sum()
+        string_dtype = get_string_dtype()
+        for col in df.columns:
+            dtype = df[col].dtype
+            if dtype == object:
+                if df[col].nunique() <= category_max_ratio * len(df):
+                    df[col] = df[col].astype('category')
+                else:
+                    df[col] = df[col].astype(string_dtype)
+            elif pd.api.types.is_integer_dtype(dtype) and len(df):
+                nullable = pd.api.types.is_extension_array_dtype(dtype)
+                df[col] = df[col].astype(get_int_dtype(df[col], nullable))
+        memory_after = df.memory_usage(deep=True).sum()
+        record.update(rows=len(df), bytes_before=int(memory_before), bytes_after=int(memory_after))
+    logger.log('INFO', f'Table "{name}" compacted from {memory_before} to {memory_after} bytes in memory')
+    return df
+
+def get_transform_options():
+    """
+    Get the settings that change the output of process_data (part of the processed data cache
+    key, with 'transform_version'). Add here any new setting that changes it.
+
+    Returns:
+        dict: Setting names as keys, and its current values as values.
+    """
+    return {
+        "compact_dtypes" : settings.compact_dtypes,
+        "category_max_ratio" : settings.category_max_ratio
+    }
 
 def process_data():
     """
@@ -173,93 +990,65 @@ def process_data():
         dict: Dictionary containing the processed and normalized dataframes as values,
             and its names (future table names) as keys.
     """
-    #Create dataframes
-    dataframes = []
-    for name in sources.keys():
-        file_path = '{data_path}\{name}\{year}-{month_name}\{name}-{day}-{month}-{year}.csv'.format(
-            data_path=settings.default_data_path, name=name, year=now.year,
-            month_name=get_month_name(now.month).lower(), day=now.day, month=now.month
-        )
-        dataframes.append(pd.read_csv(file_path))
-    #Temporal references to dataframes
-    df_museos = dataframes[0]
-    df_cines = dataframes[1]
-    df_bibliotecas = dataframes[2]
+    #Look for the same source files (and transformation code and settings) on the cache
+    file_paths = [blobs.resolve(get_source_file_path(name)) for name in sources.keys()]
+    cache_key = None
+    if cache.is_enabled():
+        cache_key = cache.get_cache_key(file_paths, transform_version, get_transform_options())
+        data = cache.load(cache_key)
+        if data:
+            #Add 'fecha_carga' column to each dataframe (the same load datetime on all of them)
+            fecha_carga = pd.to_datetime(dt.datetime.now())
+            for df in data.values():
+                df['fecha_carga'] = fecha_carga
+            return data
 
     #Create an unique espacios_culturales dataframe by filtering and normalizing data from the 3 csv
-    #Filter columns
-    museos_filter_columns = [
-        "Cod_Loc", "IdProvincia", "IdDepartamento", "categoria", "provincia", "localidad",
-        "nombre", "direccion", "CP", "cod_area", "telefono", "Mail", "Web", "fuente"]
-    cines_filter_columns = [
-        "Cod_Loc", "IdProvincia", "IdDepartamento", "Categoría", "Provincia", "Localidad",
-        "Nombre", "Dirección", "CP", "cod_area", "Teléfono", "Mail", "Web", "Fuente"]
-    bibliotecas_filter_columns = [
-        "Cod_Loc", "IdProvincia", "IdDepartamento", "Categoría", "Provincia", "Localidad",
-        "Nombre", "Domicilio", "CP", "Cod_tel", "Teléfono", "Mail", "Web", "Fuente"]
-    #Filtered dataframes
-    filtered_dataframes = [
-        df_museos[museos_filter_columns],
-        df_cines[cines_filter_columns],
-        df_bibliotecas[bibliotecas_filter_columns]]
-    #Iterate each dataframe
-    for df in filtered_dataframes:
-        #Rename the columns with appropiate names
-        df.columns = [
-            "id_localidad", "id_provincia", "id_departamento", "categoria", "provincia",
-            "localidad", "nombre", "domicilio", "cp", "cod_area", "telefono", "mail", "web", "fuente"
-        ]
-        #Set correct column types
-        #Numeric columns
-        for col in df.columns[0:3]:
-            df[col] = pd.to_numeric(df[col])
-        #String columns
-        for col in df.columns[3:-1]:
-            df[col] = df[col].astype(str)
-        #Delete decimals on not null cod_area values
-        df["cod_area"] = df["cod_area"].apply(lambda x : x.split('.')[0] if pd.notna(x) else x)
-        #Replace "s/d" and "nan" by null values
-        for col in ["cod_area", "telefono", "mail", "web"]:
-            df[col] = df[col].apply(lambda x : np.NaN if x in ['s/d', 'nan'] else x)
-        #Modify the column "telefono" to include "cod_area"
-        df["telefono"] = '(' + df["cod_area"] + ') ' + df["telefono"]
-        #Drop "cod_area" column
-        df.drop("cod_area", axis=1, inplace=True)
-    
-    #Normalize and rename some columns from 'cines' dataframe
-    df_cines["espacio_INCAA"] = df_cines["espacio_INCAA"].map({'Si' : True, 'SI' : True}, na_action='ignore')
-    df_cines["espacio_INCAA"] = df_cines["espacio_INCAA"].replace(np.nan, False)
-    #Include relevante columns from 'cines' dataframe into the filtered dataframe
-    filtered_dataframes[1][["pantallas", "butacas", "espacio_incaa"]] = \
-        df_cines[["Pantallas", "Butacas", "espacio_INCAA"]]
+    filtered_dataframes = []
+    #Read and normalize each source on its own process
+    if settings.process_workers > 1:
+        with metrics.stage('read_normalize') as record:
+            with ProcessPoolExecutor(max_workers=settings.process_workers) as executor:
+                filtered_dataframes = list(executor.map(read_source_dataframe, sources.keys(), file_paths))
+            record['rows'] = sum(len(df) for df in filtered_dataframes)
+    else:
+        for name, file_path in zip(sources.keys(), file_paths):
+            with metrics.stage('read', source=name) as record:
+                df = read_source_csv(name, file_path)
+                record.update(rows=len(df), bytes=os.path.getsize(file_path))
+            with metrics.stage('normalize', source=name) as record:
+                filtered_dataframes.append(get_source_dataframe(name, df))
+                record['rows'] = len(df)
     
     #Concatenate the dataframes into one unique dataframe called "espacios_culturales"
     df_espacios_culturales = pd.concat(filtered_dataframes, ignore_index=True)
-    df_espacios_culturales.reset_index(inplace=True)
-    df_espacios_culturales.rename(columns={"index" : "id_espacio_cultural"}, inplace=True)
-    #Set correct dtypes (Int64 is like built-in int but can store null values)
-    df_espacios_culturales["pantallas"] = df_espacios_culturales["pantallas"].astype('Int64')
-    df_espacios_culturales["butacas"] = df_espacios_culturales["butacas"].astype('Int64')
-    df_espacios_culturales["espacio_incaa"] = df_espacios_culturales["espacio_incaa"].astype(bool)
-
-    #Build provinces dataframe
-    df_provincias = df_espacios_culturales.groupby("id_provincia", as_index=False)["provincia"].max()
-    #Build localidades dataframe
-    df_localidades = df_espacios_culturales.groupby("id_localidad", as_index=False)["localidad"].max()
-    #Build categorias dataframe
-    df_categorias = pd.DataFrame(df_espacios_culturales["categoria"].unique()).reset_index()
-    df_categorias.columns = ["id_categoria", "categoria"]
-    #Normalize 'categoria' column into 'id_categoria'
-    df_espacios_culturales["id_categoria"] = df_espacios_culturales["categoria"].apply(
-        lambda x : df_categorias[df_categorias.categoria == x].id_categoria.values[0]
-    )
-    #Build fuentes dataframe
-    df_fuentes = pd.DataFrame(df_espacios_culturales["fuente"].unique()).reset_index()
-    df_fuentes.columns = ["id_fuente", "fuente"]
-    #Normalize 'fuente' column into 'id_fuente'
-    df_espacios_culturales["id_fuente"] = df_espacios_culturales["fuente"].apply(
-        lambda x : df_fuentes[df_fuentes.fuente == x].id_fuente.values[0]
-    )
+    #Set correct dtypes
+    set_espacios_culturales_dtypes(df_espacios_culturales)
+
+    with metrics.stage('dimensions') as record:
+        #Build provinces dataframe
+        df_provincias = get_dimension_table(df_espacios_culturales, "id_provincia", "provincia")
+        #Build localidades dataframe
+        df_localidades = get_dimension_table(df_espacios_culturales, "id_localidad", "localidad")
+        #Load the ids given to espacios culturales, categorias and fuentes on previous runs
+        row_ids = load_row_ids()
+        id_mappings = load_json_file(settings.id_mappings_path)
+        #Give each espacio cultural its id
+        df_espacios_culturales.insert(0, "id_espacio_cultural", get_row_ids(df_espacios_culturales, row_ids))
+        #Build categorias dataframe, and normalize 'categoria' column into 'id_categoria'
+        df_categorias, df_espacios_culturales["id_categoria"] = encode_dimension(
+            df_espacios_culturales["categoria"], "id_categoria", id_mappings.setdefault("categorias", {}))
+        #Build fuentes dataframe, and normalize 'fuente' column into 'id_fuente'
+        df_fuentes, df_espacios_culturales["id_fuente"] = encode_dimension(
+            df_espacios_culturales["fuente"], "id_fuente", id_mappings.setdefault("fuentes", {}))
+        record['rows'] = len(df_espacios_culturales)
+    #Save the ids, so they are kept on future runs
+    save_row_ids(row_ids)
+    save_json_file(id_mappings, settings.id_mappings_path)
+    #Build the summary tables
+    with metrics.stage('summaries') as record:
+        summaries = get_summary_tables(df_espacios_culturales)
+        record['rows'] = len(df_espacios_culturales)
     #Drop redundant columns on "espacios_culturales" dataframe
     df_espacios_culturales.drop(["provincia", "localidad", "categoria", "fuente"], axis=1, inplace=True)
 
@@ -271,27 +1060,232 @@ def process_data():
         "localidades" : df_localidades,
         "categorias" : df_categorias,
         "fuentes" : df_fuentes,
-        "espacios_culturales" : df_espacios_culturales
+        "espacios_culturales" : df_espacios_culturales,
+        **summaries
     }
-    #Add 'fecha_carga' column to each dataframe
+    #Use compact dtypes
+    if settings.compact_dtypes:
+        for df_name, df in data.items():
+            compact_dataframe(df, df_name)
+    #Save the processed data on the cache
+    if cache_key:
+        cache.save(cache_key, data)
+    #Add 'fecha_carga' column to each dataframe (the same load datetime on all of them)
+    fecha_carga = pd.to_datetime(dt.datetime.now())
     for df in data.values():
-        df['fecha_carga'] = pd.to_datetime(dt.datetime.now())
+        df['fecha_carga'] = fecha_carga
     #Return the processed data
     return data
 
-def set_up_database(data):
+def get_chunk_dtypes():
     """
-    Ask the psql module for a database engine. If get it, it will create a .sql file
-    (path specified in .env file) and then ask the psql module to execute that file.
-    This will create the tables in the database from the 'data' argument dataframes.
+    Get the dtypes of the espacios_culturales chunks (see add_chunk), fixed for all of them:
+    otherwise they would depend on the values of each chunk (like integer ids being floats,
+    or nullable integers, on the chunks with null values).
 
-    Args:
+    Returns:
+        dict: espacios_culturales column names as keys (in order), and the dtypes as values.
+    """
+    #(Int64 is like built-in int but can store null values)
+    dtypes = {"id_espacio_cultural" : 'int64'}
+    for col in source_column_names[0:3]:
+        dtypes[col] = 'Int64'
+    for col in ["nombre", "domicilio", "cp", "telefono", "mail", "web"]:
+        dtypes[col] = 'object'
+    dtypes.update(get_extra_columns())
+    dtypes.update({"id_categoria" : 'Int64', "id_fuente" : 'Int64', "fecha_carga" : 'datetime64[ns]'})
+    return dtypes
+
+def get_chunk_schema(state):
+    """
+    Get an empty espacios_culturales dataframe, with the columns and dtypes of its chunks.
+
+    Args:
+        state (dict): Chunk state (see get_chunk_state).
+
+    Returns:
+        DataFrame: Dataframe without rows.
+    """
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in state["dtypes"].items()})
+
+def get_chunk_state():
+    """
+    Get the state shared by the chunks of espacios_culturales while they are processed
+    (see add_chunk): the ids given to espacios culturales, categorias and fuentes on previous
+    runs (and on the previous chunks), the partial dimension dataframes of each chunk,
+    the espacios_culturales columns (and the dtypes of its chunks), the load datetime and
+    the number of rows processed.
+
+    Returns:
+        dict: The initial state.
+    """
+    return {
+        #Load the ids given to espacios culturales, categorias and fuentes on previous runs
+        "row_ids" : load_row_ids(),
+        "id_mappings" : load_json_file(settings.id_mappings_path),
+        #Partial dimension dataframes of each chunk (combined once, by get_chunked_data)
+        "dimensions" : {
+            "provincias" : [pd.DataFrame(columns=["id_provincia", "provincia"])],
+            "localidades" : [pd.DataFrame(columns=["id_localidad", "localidad"])],
+            "categorias" : [pd.DataFrame(columns=["id_categoria", "categoria"])],
+            "fuentes" : [pd.DataFrame(columns=["id_fuente", "fuente"])]
+        },
+        #All the espacios_culturales columns, in order ('cod_area' is dropped on normalization)
+        "columns" : ["id_espacio_cultural"] + [col for col in source_column_names if col != "cod_area"] + \
+            list(get_extra_columns().keys()),
+        #Columns and dtypes of the espacios_culturales chunks
+        "dtypes" : get_chunk_dtypes(),
+        #Summary tables, updated with each chunk
+        "summaries" : {},
+        "fecha_carga" : pd.to_datetime(dt.datetime.now()),
+        "n_rows" : 0
+    }
+
+def add_chunk(df, state):
+    """
+    Turn a filtered and normalized source chunk (see get_source_dataframe) into an
+    espacios_culturales chunk: its rows get its ids (see get_row_ids), its partial dimension
+    dataframes are added to 'state', and categorias and fuentes are encoded.
+
+    Args:
+        df (DataFrame): Filtered and normalized source chunk.
+        state (dict): Chunk state (see get_chunk_state). Updated in place.
+
+    Returns:
+        DataFrame: espacios_culturales chunk, with its 'fecha_carga' column (and the
+            dtypes of get_chunk_dtypes).
+    """
+    dimensions = state["dimensions"]
+    #Give each row its id
+    df.insert(0, "id_espacio_cultural", get_row_ids(df, state["row_ids"]))
+    df = df.reindex(columns=state["columns"])
+    state["n_rows"] += len(df)
+    #Set correct dtypes
+    set_espacios_culturales_dtypes(df)
+    #Add the partial dimension dataframes of the chunk (only its own rows, so each chunk costs the same)
+    #(its distinct pairs: grouping by id is done once, by get_chunked_data)
+    for table, id_col, value_col in [
+        ("provincias", "id_provincia", "provincia"), ("localidades", "id_localidad", "localidad")]:
+        dimensions[table].append(df[[id_col, value_col]].drop_duplicates())
+    for table, id_col, value_col in [
+        ("categorias", "id_categoria", "categoria"), ("fuentes", "id_fuente", "fuente")]:
+        df_dimension, df[id_col] = encode_dimension(df[value_col], id_col, state["id_mappings"].setdefault(table, {}))
+        dimensions[table].append(df_dimension)
+    #Update the summary tables
+    state["summaries"] = combine_summary_tables(state["summaries"], get_summary_tables(df))
+    #Drop redundant columns and add 'fecha_carga'
+    df.drop(["provincia", "localidad", "categoria", "fuente"], axis=1, inplace=True)
+    df['fecha_carga'] = state["fecha_carga"]
+    #The same columns and dtypes on every chunk
+    return df[list(state["dtypes"].keys())].astype(state["dtypes"])
+
+def get_chunked_data(state, df_espacios_culturales=None):
+    """
+    Get the dimension and summary dataframes built from the chunks processed so far,
+    ready to be loaded (same order as process_data). The partial dimension dataframes of
+    the chunks are combined here, in a single pass.
+
+    Args:
+        state (dict): Chunk state (see get_chunk_state).
+        df_espacios_culturales (DataFrame, optional): espacios_culturales dataframe, placed between
+            the dimension and the summary dataframes. Defaults to None (not included).
+
+    Returns:
+        dict: Dictionary with table names as keys, and DataFrames as values.
+    """
+    data = {}
+    for table, partial_dfs in state["dimensions"].items():
+        df = pd.concat(partial_dfs, ignore_index=True)
+        id_col, value_col = df.columns
+        #(the provincias and localidades names of each chunk are combined like on process_data)
+        if table in ["provincias", "localidades"]:
+            df = get_dimension_table(df, id_col, value_col)
+        else:
+            df = df.drop_duplicates(id_col)
+        df = df.sort_values(id_col, ignore_index=True)
+        df[id_col] = df[id_col].astype('int64')
+        if settings.compact_dtypes:
+            compact_dataframe(df, table)
+        df['fecha_carga'] = state["fecha_carga"]
+        data[table] = df
+    if df_espacios_culturales is not None:
+        data["espacios_culturales"] = df_espacios_culturales
+    for table, df in state["summaries"].items():
+        df = df.sort_values(df.columns[0], ignore_index=True)
+        if settings.compact_dtypes:
+            compact_dataframe(df, table)
+        df['fecha_carga'] = state["fecha_carga"]
+        data[table] = df
+    return data
+
+def process_data_chunked(chunk_size=settings.process_chunk_size, spool_path=settings.spool_path):
+    """
+    Same as process_data, but reading the source files in chunks of 'chunk_size' rows, so
+    memory usage doesn't depend on the size of the files.
+    Each normalized espacios_culturales chunk is written to a spool file, while the
+    provincias, localidades, categorias and fuentes dataframes are built incrementally.
+
+    Args:
+        chunk_size (int, optional): Number of rows per chunk. Defaults to settings.process_chunk_size.
+        spool_path (str, optional): Path to the spool file. Defaults to settings.spool_path.
+
+    Returns:
+        tuple: Dictionary like the one returned by process_data (but 'espacios_culturales' has
+            no rows, only its columns and dtypes), and dictionary with table names as keys
+            and iterators over its chunks as values.
+    """
+    state = get_chunk_state()
+    #Ensure the directory exists
+    Path(spool_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(spool_path, 'wb') as spool:
+        for name in sources.keys():
+            file_path = get_source_file_path(name)
+            for chunk in read_source_csv(name, file_path, chunksize=chunk_size):
+                #Filter, normalize and write the chunk
+                df = add_chunk(get_source_dataframe(name, chunk), state)
+                pickle.dump(df, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    #Save the ids, so they are kept on future runs
+    save_row_ids(state["row_ids"])
+    save_json_file(state["id_mappings"], settings.id_mappings_path)
+    logger.log('INFO', f'Processed {state["n_rows"]} rows in chunks of {chunk_size} rows')
+
+    #Group processed data (same order as process_data)
+    #(only the columns and dtypes of 'espacios_culturales', its rows are in the spool file)
+    data = get_chunked_data(state, get_chunk_schema(state))
+    return data, {"espacios_culturales" : read_spool(spool_path)}
+
+def read_spool(file_path):
+    """
+    Iterate over the dataframes written to a spool file by process_data_chunked.
+
+    Args:
+        file_path (str): Path to the spool file.
+
+    Yields:
+        DataFrame: Each dataframe, in the order they were written.
+    """
+    with open(file_path, 'rb') as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+def set_up_database(data):
+    """
+    Ask the psql module for a database engine. If get it, it will create a .sql file
+    (path specified in .env file) and then ask the psql module to execute that file.
+    This will create the tables in the database from the 'data' argument dataframes
+    (or alter the existing ones whose columns changed, see get_schema_changes).
+
+    Args:
         data (dict): Dictionary used to create database tables.
             Containing table names as keys, and DataFrames as values.
 
     Returns:
         Engine: The database engine. If None, it means the psql module could not
-            create/connect to the database.
+            create/connect to the database, or the tables could not be created or updated
+            (the .sql file is removed then, so it's not taken as applied).
     """
     #Create database if not exists
     db = psql.get_database()
@@ -301,15 +1295,179 @@ def set_up_database(data):
         save_sql_tables(default_sql_path, data)
         #Catch possible exceptions
         try:
-            #Create the tables executing that file
-            psql.execute_from_sql(default_sql_path)
-            #Log
-            logger.log('INFO', f'SQL script "{default_sql_path}" executed successfully!')
+            #Compare the script with the one that created the current schema
+            with open(default_sql_path, 'r') as file:
+                statements = get_schema_statements(file.read())
+            fingerprint = hashlib.sha256('\n'.join(statements).encode()).hexdigest()
+            old_fingerprint, old_statements = psql.get_schema_metadata()
+            missing_tables = psql.get_missing_tables(data.keys())
+            if fingerprint == old_fingerprint and not missing_tables:
+                logger.log('INFO', 'Schema unchanged, SQL script not executed.')
+            else:
+                #Alter the existing tables whose columns changed (and drop the ones to rebuild)
+                changes, rebuilt_tables = get_schema_changes(old_statements, statements)
+                #If some table is missing (or was dropped to rebuild it), execute the whole script
+                if missing_tables or rebuilt_tables:
+                    new_statements = changes + statements
+                #Otherwise, execute only the statements that changed
+                else:
+                    new_statements = changes + [statement for statement in statements if statement not in old_statements]
+                #(in one transaction, so the schema is only remembered if all of them were executed)
+                psql.execute_statements(new_statements)
+                logger.log('INFO', f'Schema changed, {len(new_statements)} statements from "{default_sql_path}" executed successfully!')
+                #The snapshot of the last incremental load doesn't describe the altered tables
+                if changes:
+                    Path(settings.load_snapshot_path).unlink(missing_ok=True)
+                #Remember the schema
+                psql.save_schema_metadata(fingerprint, statements)
         except Exception as e:
             logger.log('ERROR', f'Failed to execute SQL script from: "{default_sql_path}"', str(e))
+            Path(default_sql_path).unlink(missing_ok=True)
+            return None
     #Return the engine
     return db
 
+def get_schema_statements(sql):
+    """
+    Split a SQL script generated by save_sql_tables into its statements. Each
+    'DROP CONSTRAINT IF EXISTS' statement is kept together with the 'ADD CONSTRAINT'
+    statement after it, so they are always executed together.
+
+    Args:
+        sql (str): SQL script.
+
+    Returns:
+        list: SQL statements (str).
+    """
+    statements = []
+    for statement in sql.split(';'):
+        statement = statement.strip()
+        if not statement:
+            continue
+        #Join the constraint with its drop statement
+        if ' ADD CONSTRAINT ' in statement and statements \
+                and ' DROP CONSTRAINT IF EXISTS ' in statements[-1] and '\n' not in statements[-1]:
+            statements[-1] += '\n' + statement + ';'
+        else:
+            statements.append(statement + ';')
+    return statements
+
+def get_table_columns(statement):
+    """
+    Get the columns of a 'CREATE TABLE' statement generated by save_sql_tables.
+
+    Args:
+        statement (str): SQL statement.
+
+    Returns:
+        tuple: Table name (str), dictionary with column names as keys and SQL types as values,
+            and primary key (str, like 'id' or '(id, fecha_carga)'). None if it's not a 'CREATE TABLE' statement.
+    """
+    if not statement.startswith('CREATE TABLE '):
+        return None
+    header, _, body = statement.partition('(')
+    columns = {}
+    primary_key = None
+    #One column (or primary key) per line, indented with a tab
+    for line in body.split('\n'):
+        if not line.startswith('\t'):
+            continue
+        line = line.strip().rstrip(',')
+        if line.startswith('PRIMARY KEY '):
+            primary_key = line[len('PRIMARY KEY '):]
+            continue
+        col_name, col_type = line.split(' ', 1)
+        if col_type.endswith(' PRIMARY KEY'):
+            col_type = col_type[:-len(' PRIMARY KEY')]
+            primary_key = col_name
+        columns[col_name] = col_type
+    return header.split()[-1], columns, primary_key
+
+def get_schema_changes(old_statements, statements):
+    """
+    Get the statements that change the existing tables created by 'old_statements' into the
+    ones of 'statements' (both generated by save_sql_tables), as 'CREATE TABLE IF NOT EXISTS'
+    does nothing on a table that already exists:
+    added, removed and retyped columns are altered, tables whose primary key changed are dropped
+    (to be created again), and foreign keys and indexes no longer on the script are dropped.
+
+    Args:
+        old_statements (list): SQL statements that created the current schema.
+        statements (list): SQL statements of the new schema.
+
+    Returns:
+        tuple: SQL statements (list), and names of the dropped tables (list).
+    """
+    old_tables = {table[0]: table[1:] for table in map(get_table_columns, old_statements) if table}
+    new_tables = {table[0]: table[1:] for table in map(get_table_columns, statements) if table}
+    #Only the tables that exist can be altered
+    missing_tables = psql.get_missing_tables(list(old_tables.keys()))
+    changes = []
+    rebuilt_tables = []
+    for table_name, (columns, primary_key) in new_tables.items():
+        if table_name not in old_tables or table_name in missing_tables:
+            continue
+        old_columns, old_primary_key = old_tables[table_name]
+        #A new primary key can't be altered in place, the table is created again
+        if primary_key != old_primary_key:
+            logger.log('WARNING', f'Primary key of table "{table_name}" changed, the table is dropped and created again.')
+            changes.append(f'DROP TABLE IF EXISTS {table_name} CASCADE;')
+            rebuilt_tables.append(table_name)
+            continue
+        for col_name in [col_name for col_name in old_columns if col_name not in columns]:
+            changes.append(f'ALTER TABLE {table_name} DROP COLUMN IF EXISTS {col_name};')
+        for col_name, col_type in columns.items():
+            if col_name not in old_columns:
+                changes.append(f'ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col_name} {col_type};')
+            elif col_type != old_columns[col_name]:
+                changes.append(f'ALTER TABLE {table_name} ALTER COLUMN {col_name} TYPE {col_type} USING {col_name}::{col_type};')
+    for statement in old_statements:
+        if statement in statements:
+            continue
+        #Foreign keys no longer on the script (its first line is the drop statement)
+        if ' ADD CONSTRAINT ' in statement:
+            fk_table = statement.split()[2]
+            if fk_table not in missing_tables and fk_table not in rebuilt_tables:
+                changes.append(statement.split('\n')[0])
+        #Indexes no longer on the script
+        elif statement.startswith('CREATE INDEX IF NOT EXISTS '):
+            changes.append(f'DROP INDEX IF EXISTS {statement.split()[5]};')
+        #Tables no longer on the script are kept (with its data)
+        elif statement.startswith('CREATE TABLE ') and get_table_columns(statement)[0] not in new_tables:
+            logger.log('WARNING', f'Table "{get_table_columns(statement)[0]}" is no longer on the schema, it\'s not dropped.')
+    return changes, rebuilt_tables
+
+def get_table_keys(data):
+    """
+    Detect the primary and foreign keys of the tables in 'data' argument.
+    The first column of each table is its primary key, and other 'id_' columns are
+    foreign keys if they are the primary key of another table.
+
+    Args:
+        data (dict): Dictionary used to create database tables.
+            Containing table names as keys, and DataFrames as values.
+
+    Returns:
+        tuple: Dictionary with primary key columns as keys and its tables as values, and
+            dictionary with foreign key columns as keys and its tables as values.
+    """
+    #Dicts to store primary and foreign keys
+    primary_keys = {}
+    foreign_keys = {}
+    #Iterate through processed dataframes
+    for df_name, df in data.items():
+        #Iterate through the dataframe columns
+        for idx, col_name in enumerate(df.columns):
+            #Detect and store primary and foreign keys with its tables
+            if idx == 0:
+                primary_keys.update({col_name : df_name})
+            elif col_name.startswith('id_'):
+                foreign_keys.update({col_name : df_name})
+    #Exclude foreign keys without a table (like 'id_departamento',
+    #because we dont have a 'departamentos' table)
+    foreign_keys = {fk: fk_table for fk, fk_table in foreign_keys.items() if fk in primary_keys}
+    return primary_keys, foreign_keys
+
 def save_sql_tables(file_path, data):
     """
     Save a .sql file in a given path, that generates SQL tables from 'data' argument.
@@ -319,12 +1477,11 @@ def save_sql_tables(file_path, data):
         data (dict): Dictionary used to create database tables.
             Containing table names as keys, and DataFrames as values.
     """
+    #Primary and foreign keys
+    primary_keys, foreign_keys = get_table_keys(data)
+
     # Write a .sql file that will generate the database tables
     with open(file_path, 'w') as file:
-                
-        #Dicts to store primary and foreign keys
-        primary_keys = {}
-        foreign_keys = {}
 
         #Iterate through processed dataframes
         for df_name, df in data.items():
@@ -332,14 +1489,6 @@ def save_sql_tables(file_path, data):
             dtypes_dict = psql.get_dtypes_dict(df)
             #Start the create table query
             file.write("CREATE TABLE IF NOT EXISTS {table_name} ( \n".format(table_name=df_name))
-            
-            #Iterate through the dataframe columns
-            for idx, col_name in enumerate(df.columns):
-                #Detect and store primary and foreign keys with its tables
-                if idx == 0:
-                    primary_keys.update({col_name : df_name})
-                elif col_name.startswith('id_'):
-                    foreign_keys.update({col_name : df_name})
 
             #Iterate through the dataframe columns
             for idx, col_name in enumerate(df.columns):
@@ -362,10 +1511,6 @@ def save_sql_tables(file_path, data):
                     file.write("\n);\n\n")
         
         #ADD FOREIGN KEY CONSTRAINTS
-        #Exclude 'id_departamento' from foreign keys
-        #because we dont have a 'departamentos' table
-        del foreign_keys['id_departamento']
-
         for fk, fk_table in foreign_keys.items():
             #Look for the column its referencing
             pk = fk
@@ -376,11 +1521,25 @@ def save_sql_tables(file_path, data):
             #Add the constraint to the column
             file.write('ALTER TABLE {fk_table} ADD CONSTRAINT fk_{fk} FOREIGN KEY ({fk}) REFERENCES {pk_table}({pk});\n'.format( \
                     fk_table=fk_table, fk=fk, pk_table=pk_table, pk=pk))
+            #Index the column (used on joins and cascades)
+            file.write('CREATE INDEX IF NOT EXISTS ix_{fk_table}_{fk} ON {fk_table} ({fk});\n'.format( \
+                    fk_table=fk_table, fk=fk))
+
+        #History tables, partitioned by load date (only on snapshot mode)
+        if settings.load_mode == 'snapshot':
+            for df_name, df in data.items():
+                dtypes_dict = psql.get_dtypes_dict(df)
+                file.write("\nCREATE TABLE IF NOT EXISTS {table_name}_historico ( \n".format(table_name=df_name))
+                for col_name in df.columns:
+                    file.write("\t{col_name} {col_type},\n".format(col_name=col_name, col_type=dtypes_dict[col_name]))
+                #The partition key must be part of the primary key
+                file.write("\tPRIMARY KEY ({pk}, fecha_carga)\n) PARTITION BY RANGE (fecha_carga);\n".format(
+                    pk=df.columns[0]))
     
     #Log
     logger.log('INFO', f'SQL script for tables creation saved on: "{file_path}"')
     
-def update_database(db, data):
+def update_database(db, data, chunks=None):
     """
     Try to connect to a given database. If it can, look for tables named as 'data' argument keys,
     and replace all its values with the ones in its corresponding DataFrames ('data' argument values).
@@ -390,34 +1549,782 @@ def update_database(db, data):
         db (Engine): Database engine to connect.
         data (dict): Dictionary used to identify database tables and update its values.
             Containing table names as keys, and DataFrames as values.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values. Those tables are filled chunk by chunk, instead of with
+            its 'data' DataFrame. Defaults to None.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
+    """
+    chunks = chunks or {}
+    #Incremental load (not available for tables filled by chunks)
+    if settings.load_mode == 'incremental' and not chunks:
+        updated = update_database_incremental(db, data)
+        if updated is not None:
+            return updated
+    #Load a new partition of the history tables (only on PostgreSQL)
+    if settings.load_mode == 'snapshot' and db.dialect.name == 'postgresql':
+        updated = update_database_snapshot(db, data, chunks)
+        refresh_load_snapshot(data, updated, chunks)
+        return updated
+    #Load on shadow tables and swap them (only on PostgreSQL)
+    if settings.load_mode == 'swap' and db.dialect.name == 'postgresql':
+        updated = update_database_swap(db, data, chunks)
+        refresh_load_snapshot(data, updated, chunks)
+        return updated
+    #On large loads, drop the foreign keys and its indexes before loading (restored after it)
+    defer_constraints = db.dialect.name == 'postgresql' and \
+        (bool(chunks) or sum(len(df) for df in data.values()) >= settings.defer_constraints_min_rows)
+    updated = False
+    constraints_dropped = False
+    start = time.perf_counter()
+    try:
+        if defer_constraints:
+            time_join_query(db, data, 'before load')
+            drop_foreign_keys(db, data)
+            constraints_dropped = True
+            #Without foreign keys, TRUNCATE ... CASCADE doesn't empty the child tables, so all
+            #the tables are emptied now (a failed load can't leave orphan rows behind)
+            with db.connect() as con:
+                with con.begin():
+                    psql.truncate_tables(con, data.keys())
+            start = time.perf_counter()
+        #Load independent tables at the same time, on different connections
+        if settings.load_workers > 1:
+            updated = update_database_parallel(db, data, chunks)
+        else:
+            updated = update_database_sequential(db, data, chunks)
+    except Exception as e:
+        #Log the exception
+        logger.log('ERROR', 'Can\'t update tables in database.', str(e))
+        updated = False
+    finally:
+        if constraints_dropped:
+            logger.log('INFO', f'Tables loaded without foreign keys ({time.perf_counter() - start:.2f} seconds).')
+            try:
+                restore_foreign_keys(db, data)
+                time_join_query(db, data, 'after load')
+            except Exception:
+                updated = False
+    refresh_load_snapshot(data, updated, chunks)
+    return updated
+
+def update_database_sequential(db, data, chunks=None):
+    """
+    Same as update_database, truncating and filling the tables one by one
+    (on 'data' order), over a single connection.
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Dictionary used to identify database tables and update its values.
+            Containing table names as keys, and DataFrames as values.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values. Those tables are filled chunk by chunk, instead of with
+            its 'data' DataFrame. Defaults to None.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
     """
+    chunks = chunks or {}
     #Connect to db
     with db.connect() as con:
         try:
             #Iterate through processed dataframes
             for df_name, df in data.items():
-                #Truncate the table
-                con.execute('TRUNCATE {table} CASCADE;'.format(table=df_name))
-                #Fill the table with its values
-                df.to_sql(df_name, con=con, if_exists="append", index=False)
-                #Log
-                logger.log('INFO', f'Table "{df_name}" updated in database successfully.')
+                #Truncate and fill the table in the same transaction
+                with con.begin():
+                    #Truncate the table
+                    psql.truncate_tables(con, [df_name])
+                    #Fill the table with its values
+                    load_table(con, df_name, chunks.get(df_name, [df]))
         except Exception as e:
             #Log the exception
-            logger.log('ERROR', f'Can\'t update table "{df_name}" in database.', e._message)
+            logger.log('ERROR', f'Can\'t update table "{df_name}" in database.', str(e))
+            return False
+    return True
+
+def drop_foreign_keys(db, data):
+    """
+    Drop the foreign key constraints of the tables in 'data', and the indexes on its
+    columns, so rows are not checked against its parent tables while bulk loading.
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Containing table names as keys, and DataFrames as values.
+    """
+    primary_keys, foreign_keys = get_table_keys(data)
+    with db.connect() as con:
+        with con.begin():
+            for fk, fk_table in foreign_keys.items():
+                con.execute(f'ALTER TABLE {fk_table} DROP CONSTRAINT IF EXISTS fk_{fk};')
+                con.execute(f'DROP INDEX IF EXISTS ix_{fk_table}_{fk};')
+    logger.log('INFO', f'Dropped {len(foreign_keys)} foreign keys and its indexes before loading.')
+
+def restore_foreign_keys(db, data):
+    """
+    Recreate the foreign key constraints and indexes dropped by drop_foreign_keys.
+    The constraints are added as NOT VALID and validated afterwards, which checks
+    all the rows at once without blocking readers.
+    If they can't be restored, the schema metadata is cleared, so the next
+    set_up_database executes the whole SQL script again (recreating them).
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Containing table names as keys, and DataFrames as values.
+
+    Raises:
+        Exception: If the foreign keys couldn't be restored.
+    """
+    primary_keys, foreign_keys = get_table_keys(data)
+    start = time.perf_counter()
+    try:
+        with db.connect() as con:
+            with con.begin():
+                for fk, fk_table in foreign_keys.items():
+                    con.execute(f'CREATE INDEX IF NOT EXISTS ix_{fk_table}_{fk} ON {fk_table} ({fk});')
+                    con.execute(f'ALTER TABLE {fk_table} ADD CONSTRAINT fk_{fk} '
+                                f'FOREIGN KEY ({fk}) REFERENCES {primary_keys[fk]}({fk}) NOT VALID;')
+                    con.execute(f'ALTER TABLE {fk_table} VALIDATE CONSTRAINT fk_{fk};')
+        logger.log('INFO', f'Restored and validated {len(foreign_keys)} foreign keys and its indexes '
+            f'({time.perf_counter() - start:.2f} seconds).')
+    except Exception as e:
+        logger.log('ERROR', 'Can\'t restore foreign keys in database.', str(e))
+        psql.clear_schema_metadata()
+        raise
+
+def time_join_query(db, data, label):
+    """
+    Time a query joining each table with the tables its foreign keys reference, and log it.
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Containing table names as keys, and DataFrames as values.
+        label (str): Text to identify the timing on the log (like 'before load').
+    """
+    primary_keys, foreign_keys = get_table_keys(data)
+    try:
+        with db.connect() as con:
+            for fk, fk_table in foreign_keys.items():
+                start = time.perf_counter()
+                con.execute(f'SELECT COUNT(*) FROM {fk_table} JOIN {primary_keys[fk]} USING ({fk});')
+                logger.log('INFO', f'Join {fk_table} - {primary_keys[fk]} {label}: '
+                    f'{(time.perf_counter() - start) * 1000:.0f} milliseconds.')
+    except Exception as e:
+        logger.log('ERROR', f'Can\'t time join queries {label}.', str(e))
+
+def load_table(con, table_name, df_chunks):
+    """
+    Fill a database table with the values of some DataFrames (bulk loaded), logging
+    its wall time and rows per second.
+
+    Args:
+        con (Connection): Database connection.
+        table_name (str): Name of the table.
+        df_chunks (iterable): DataFrames to load, one after the other.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    start = time.perf_counter()
+    n_rows = 0
+    with metrics.stage('load', table=table_name) as record:
+        for df_chunk in df_chunks:
+            psql.load_dataframe(con, df_chunk, table_name)
+            n_rows += len(df_chunk)
+        record['rows'] = n_rows
+    elapsed = time.perf_counter() - start
+    #Log
+    logger.log('INFO', f'Table "{table_name}" updated in database successfully '
+        f'({n_rows} rows in {elapsed:.2f} seconds, {n_rows / max(elapsed, 1e-9):.0f} rows per second).')
+    return n_rows
+
+def get_table_dependencies(data):
+    """
+    Get the tables each table depends on (the ones its foreign keys reference).
+
+    Args:
+        data (dict): Dictionary used to create database tables.
+            Containing table names as keys, and DataFrames as values.
+
+    Returns:
+        dict: Table names as keys and sets of the table names they depend on as values.
+    """
+    primary_keys, foreign_keys = get_table_keys(data)
+    dependencies = {df_name: set() for df_name in data.keys()}
+    for fk, fk_table in foreign_keys.items():
+        dependencies[fk_table].add(primary_keys[fk])
+    return dependencies
+
+def run_by_dependencies(dependencies, func, max_workers):
+    """
+    Call 'func' once for each name in 'dependencies', on a thread pool. Each call starts
+    as soon as the calls of all the names it depends on have finished, so independent
+    names run at the same time. If a call fails, the ones depending on it (directly or not)
+    are skipped, and logged as skipped.
+
+    Args:
+        dependencies (dict): Names as keys and sets of the names they depend on as values.
+        func (function): Function called with each name as argument.
+        max_workers (int): Maximum number of calls running at the same time.
+
+    Returns:
+        dict: Names as keys and the values returned by its calls as values (only successful calls).
+    """
+    pending = dict(dependencies)
+    running = {}
+    results = {}
+    failed = set()
+    skipped = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            #Skip the calls whose dependencies failed or were skipped (repeated for the ones depending on those)
+            skipping = True
+            while skipping:
+                skipping = [name for name, names_needed in pending.items() if names_needed & (failed | skipped)]
+                for name in skipping:
+                    names_missing = pending.pop(name) & (failed | skipped)
+                    skipped.add(name)
+                    logger.log('WARNING', f'Skipped "{name}", as it depends on: {", ".join(sorted(names_missing))}')
+            #Start the calls whose dependencies are done
+            for name, names_needed in list(pending.items()):
+                if names_needed <= results.keys():
+                    running[executor.submit(func, name)] = name
+                    pending.pop(name)
+            if not running:
+                #Circular dependencies (the calls left can't start)
+                if pending:
+                    logger.log('ERROR', f'Circular dependencies between: {", ".join(pending.keys())}')
+                break
+            #Wait for any call to finish
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.log('ERROR', f'Failed on "{name}"', str(e))
+                    failed.add(name)
+    return results
+
+def update_database_parallel(db, data, chunks=None, max_workers=settings.load_workers):
+    """
+    Same as update_database, but loading the tables that don't depend on each other at the
+    same time, each one on its own pooled connection. A table starts loading as soon as the
+    tables its foreign keys reference are loaded.
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Dictionary used to identify database tables and update its values.
+            Containing table names as keys, and DataFrames as values.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values. Those tables are filled chunk by chunk, instead of with
+            its 'data' DataFrame. Defaults to None.
+        max_workers (int, optional): Maximum number of tables loading at the same time.
+            Defaults to settings.load_workers.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
+    """
+    chunks = chunks or {}
+    #Truncate all the tables at once (truncating them one by one would lock
+    #the child tables on each TRUNCATE CASCADE)
+    try:
+        with db.connect() as con:
+            with con.begin():
+                psql.truncate_tables(con, data.keys())
+    except Exception as e:
+        logger.log('ERROR', 'Can\'t truncate tables in database.', str(e))
+        return False
+    #Fill each table on its own connection and transaction
+    def fill_table(df_name):
+        with db.connect() as con:
+            with con.begin():
+                return load_table(con, df_name, chunks.get(df_name, [data[df_name]]))
+    start = time.perf_counter()
+    results = run_by_dependencies(get_table_dependencies(data), fill_table, max_workers)
+    elapsed = time.perf_counter() - start
+    logger.log('INFO', f'{len(results)} of {len(data)} tables updated in database ({elapsed:.2f} seconds).')
+    return len(results) == len(data)
+
+def update_database_swap(db, data, chunks=None):
+    """
+    Replace the values of the database tables without locking them during the load:
+    each table is bulk loaded into a shadow table ('<table>_new'), then its primary key,
+    foreign keys and foreign key indexes are built there, and finally all the shadow tables are swapped with
+    the live ones by renaming them, inside one short transaction.
+
+    Args:
+        db (Engine): Database engine to connect (PostgreSQL).
+        data (dict): Dictionary used to identify database tables and update its values.
+            Containing table names as keys, and DataFrames as values.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values. Those tables are filled chunk by chunk, instead of with
+            its 'data' DataFrame. Defaults to None.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
+    """
+    chunks = chunks or {}
+    primary_keys, foreign_keys = get_table_keys(data)
+    #Connect to db
+    with db.connect() as con:
+        try:
+            #Drop the shadow tables left by a failed swap
+            drop_shadow_tables(con, data.keys())
+            #Fill the shadow tables (parents first, following 'data' order)
+            for df_name, df in data.items():
+                start = time.perf_counter()
+                n_rows = 0
+                with con.begin():
+                    #Create the shadow table with the same columns as the live one
+                    con.execute(f'CREATE TABLE {df_name}_new (LIKE {df_name} INCLUDING DEFAULTS);')
+                    #Fill it (bulk loaded, without indexes yet)
+                    for df_chunk in chunks.get(df_name, [df]):
+                        psql.load_dataframe(con, df_chunk, f'{df_name}_new')
+                        n_rows += len(df_chunk)
+                    #Build its primary key and foreign keys (referencing the other shadow tables)
+                    con.execute(f'ALTER TABLE {df_name}_new ADD CONSTRAINT {df_name}_new_pkey PRIMARY KEY ({df.columns[0]});')
+                    for fk, fk_table in foreign_keys.items():
+                        if fk_table == df_name:
+                            con.execute(f'ALTER TABLE {df_name}_new ADD CONSTRAINT fk_{fk} '
+                                        f'FOREIGN KEY ({fk}) REFERENCES {primary_keys[fk]}_new({fk});')
+                            con.execute(f'CREATE INDEX ix_{df_name}_{fk}_new ON {df_name}_new ({fk});')
+                elapsed = time.perf_counter() - start
+                logger.log('INFO', f'Shadow table "{df_name}_new" loaded ({n_rows} rows in {elapsed:.2f} seconds).')
+            #Swap the tables in one transaction
+            start = time.perf_counter()
+            with con.begin():
+                #Rename following 'data' order (parents first)
+                for df_name in data.keys():
+                    con.execute(f'ALTER TABLE {df_name} RENAME TO {df_name}_old;')
+                    con.execute(f'ALTER TABLE {df_name}_new RENAME TO {df_name};')
+                #Drop the old tables (children first)
+                for df_name in reversed(list(data.keys())):
+                    con.execute(f'DROP TABLE {df_name}_old;')
+                #Give the primary keys and indexes its usual name
+                for df_name in data.keys():
+                    con.execute(f'ALTER TABLE {df_name} RENAME CONSTRAINT {df_name}_new_pkey TO {df_name}_pkey;')
+                for fk, fk_table in foreign_keys.items():
+                    con.execute(f'ALTER INDEX ix_{fk_table}_{fk}_new RENAME TO ix_{fk_table}_{fk};')
+            elapsed = time.perf_counter() - start
+            logger.log('INFO', f'Tables swapped in database successfully ({elapsed * 1000:.0f} milliseconds).')
+        except Exception as e:
+            #Log the exception
+            logger.log('ERROR', 'Can\'t update tables by swapping them in database.', str(e))
+            #Don't leave the shadow tables behind
+            try:
+                drop_shadow_tables(con, data.keys())
+            except Exception as e:
+                logger.log('ERROR', 'Can\'t drop the shadow tables in database.', str(e))
+            return False
+    return True
+
+def drop_shadow_tables(con, table_names):
+    """
+    Drop the shadow tables ('<table>_new') of some tables, if they exist (children first,
+    and with CASCADE, as they may reference each other).
+
+    Args:
+        con (Connection): Database connection (PostgreSQL).
+        table_names (list): Names of the tables (without '_new').
+    """
+    with con.begin():
+        for table_name in reversed(list(table_names)):
+            con.execute(f'DROP TABLE IF EXISTS {table_name}_new CASCADE;')
+
+def update_database_snapshot(db, data, chunks=None):
+    """
+    Same as update_database, but keeping the history: each table has a '<table>_historico'
+    table partitioned by 'fecha_carga', and each load is bulk loaded into a new partition
+    (a standalone table, attached when it's full). Then the tables are refilled from the new
+    partitions, so they still hold the latest data. Partitions older than
+    settings.snapshot_retention days are dropped. All in one transaction (PostgreSQL only).
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Dictionary used to identify database tables and update its values.
+            Containing table names as keys, and DataFrames as values.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values. Those tables are filled chunk by chunk, instead of with
+            its 'data' DataFrame. Defaults to None.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
+    """
+    chunks = chunks or {}
+    #Load datetime of this data (the same on all the tables), and the partition bounds
+    fecha_carga = next(df['fecha_carga'].iloc[0] for df in data.values() if len(df))
+    bounds = (fecha_carga, fecha_carga + pd.Timedelta(microseconds=1))
+    suffix = fecha_carga.strftime('%Y%m%d%H%M%S%f')
+    start = time.perf_counter()
+    #Connect to db
+    with db.connect() as con:
+        try:
+            with con.begin():
+                for df_name, df in data.items():
+                    #Load the new partition and attach it
+                    partition = f'{df_name}_historico_{suffix}'
+                    con.execute(f'CREATE TABLE {partition} (LIKE {df_name}_historico INCLUDING DEFAULTS INCLUDING CONSTRAINTS);')
+                    load_table(con, partition, chunks.get(df_name, [df]))
+                    psql.attach_partition(con, f'{df_name}_historico', partition, 'fecha_carga', *bounds)
+                #Refill the tables with the new partitions (parent tables first)
+                psql.truncate_tables(con, data.keys())
+                for df_name in data.keys():
+                    con.execute(f'INSERT INTO {df_name} SELECT * FROM {df_name}_historico_{suffix};')
+                #Drop the partitions out of the retention period
+                drop_old_partitions(con, data.keys())
+        except Exception as e:
+            #Log the exception
+            logger.log('ERROR', 'Can\'t load the snapshot in database.', str(e))
+            return False
+    logger.log('INFO', f'Snapshot "{suffix}" loaded in database successfully ({time.perf_counter() - start:.2f} seconds).')
+    return True
+
+def drop_old_partitions(con, table_names, retention_days=settings.snapshot_retention):
+    """
+    Drop the partitions of the history tables loaded more than 'retention_days' days ago
+    (a partition is dropped at once, no rows are deleted).
+
+    Args:
+        con (Connection): Database connection (PostgreSQL).
+        table_names (list): Names of the tables (without '_historico').
+        retention_days (int, optional): Days of history kept, 0 to keep all.
+            Defaults to settings.snapshot_retention.
+    """
+    if not retention_days:
+        return
+    #Partition names end with its load datetime, so they can be compared as strings
+    min_suffix = (dt.datetime.now() - dt.timedelta(days=retention_days)).strftime('%Y%m%d%H%M%S%f')
+    for table_name in table_names:
+        for partition in psql.get_partitions(con, f'{table_name}_historico'):
+            if partition.rsplit('_', 1)[-1] < min_suffix:
+                con.execute(f'DROP TABLE {partition};')
+                logger.log('INFO', f'Dropped partition "{partition}" (older than {retention_days} days).')
+
+def get_row_hashes(df):
+    """
+    Get a hash of the content of each row of a processed dataframe ('fecha_carga' excluded).
+
+    Args:
+        df (DataFrame): Processed dataframe, with its primary key as first column.
+
+    Returns:
+        Series: Row hashes (uint64), indexed by primary key.
+    """
+    hashes = pd.util.hash_pandas_object(df.drop(columns='fecha_carga'), index=False)
+    hashes.index = df[df.columns[0]].values
+    return hashes
+
+def get_load_snapshot(data):
+    """
+    Get the snapshot of some processed data: the row hashes of each table.
+
+    Args:
+        data (dict): Containing table names as keys, and DataFrames as values.
+
+    Returns:
+        dict: Table names as keys and its row hashes (Series indexed by primary key) as values.
+    """
+    return {df_name: get_row_hashes(df) for df_name, df in data.items()}
+
+def save_load_snapshot(data, snapshot_path=None, snapshot=None):
+    """
+    Save the snapshot of the data loaded on the database, used by the incremental load.
+
+    Args:
+        data (dict): Containing table names as keys, and DataFrames as values.
+        snapshot_path (str, optional): Path to the snapshot file. Defaults to settings.load_snapshot_path.
+        snapshot (dict, optional): Snapshot of 'data', if already computed. Defaults to None.
+    """
+    pd.to_pickle(snapshot or get_load_snapshot(data), snapshot_path or settings.load_snapshot_path)
+
+def refresh_load_snapshot(data, updated, chunks=None):
+    """
+    Keep the snapshot used by the incremental load in line with the database after a full load:
+    save it if the tables were loaded on incremental load mode (not by chunks), or remove it
+    otherwise, as the tables (even if its load failed) don't hold the data it describes anymore.
+
+    Args:
+        data (dict): Containing table names as keys, and DataFrames as values.
+        updated (bool): True if all the tables were updated.
+        chunks (dict, optional): Dictionary with table names as keys and iterators over
+            DataFrames as values, if the tables were filled by chunks. Defaults to None.
+    """
+    if updated and settings.load_mode == 'incremental' and not chunks:
+        save_load_snapshot(data)
+    else:
+        Path(settings.load_snapshot_path).unlink(missing_ok=True)
+
+def update_database_incremental(db, data, snapshot_path=None):
+    """
+    Compare the processed dataframes with the snapshot of the last loaded data (row hashes by
+    primary key), and apply only the differences to the database tables: new and changed rows
+    are upserted and missing rows are deleted, all in one transaction.
+    If there is no snapshot yet, nothing is done (a full load is needed first).
+
+    Args:
+        db (Engine): Database engine to connect.
+        data (dict): Dictionary used to identify database tables and update its values.
+            Containing table names as keys, and DataFrames as values.
+        snapshot_path (str, optional): Path to the snapshot file. Defaults to settings.load_snapshot_path.
+
+    Returns:
+        bool: True if the tables were updated. False if they couldn't be updated.
+            None if a full load is needed (there is no snapshot).
+    """
+    snapshot_path = snapshot_path or settings.load_snapshot_path
+    #Row hashes of the new data
+    new_snapshot = get_load_snapshot(data)
+    #Row hashes of the last loaded data
+    try:
+        snapshot = pd.read_pickle(snapshot_path)
+    except Exception:
+        snapshot = {}
+    if set(snapshot.keys()) != set(data.keys()):
+        logger.log('INFO', 'No snapshot of the last loaded data, a full load is needed.')
+        return None
+    #Connect to db
+    with db.connect() as con:
+        try:
+            with con.begin():
+                deletes = {}
+                #Insert and update parent tables first, to avoid foreign key errors
+                for df_name, df in data.items():
+                    pk = df.columns[0]
+                    new_hashes, old_hashes = new_snapshot[df_name], snapshot[df_name]
+                    #New rows, and rows whose content changed
+                    in_old = new_hashes.index.isin(old_hashes.index)
+                    upsert_mask = ~in_old
+                    upsert_mask[in_old] = new_hashes.values[in_old] != old_hashes.loc[new_hashes.index[in_old]].values
+                    if upsert_mask.any():
+                        psql.upsert_dataframe(con, df[upsert_mask], df_name, pk)
+                    #Rows not longer present
+                    deletes[df_name] = old_hashes.index.difference(new_hashes.index).tolist()
+                    #Log
+                    logger.log('INFO', f'Table "{df_name}": {(~in_old).sum()} rows inserted, '
+                        f'{upsert_mask.sum() - (~in_old).sum()} rows updated, {len(deletes[df_name])} rows deleted.')
+                #Delete from child tables first
+                for df_name in reversed(list(data.keys())):
+                    psql.delete_rows(con, df_name, data[df_name].columns[0], deletes[df_name])
+        except Exception as e:
+            #Log the exception
+            logger.log('ERROR', 'Can\'t update tables incrementally in database.', str(e))
+            return False
+    #Remember the loaded data
+    save_load_snapshot(data, snapshot_path, new_snapshot)
+    logger.log('INFO', 'Tables updated incrementally in database successfully.')
+    return True
+
+def produce_chunks(name, url, cache_entry, state):
+    """
+    Producer of the overlapped execution (see run_overlapped): download a source file and,
+    as soon as it's downloaded, parse and normalize it by chunks, handing each
+    espacios_culturales chunk to the loader through the bounded queue of 'state'.
+
+    Args:
+        name (str): Source name (a key of 'sources' dictionary).
+        url (str): Url from where the source file can be downloaded.
+        cache_entry (dict): Fetch metadata of the previous download (None if there is not).
+        state (dict): Chunk state (see get_chunk_state), with the 'queue', 'lock', 'stop'
+            and 'chunk_size' of the overlapped execution.
+
+    Returns:
+        dict: Fetch metadata of the download. None if it couldn't be downloaded.
+    """
+    fetch_info = get_source_file(name, url, cache_entry)
+    if not fetch_info:
+        return None
+    file_path = get_source_file_path(name)
+    with metrics.stage('process', source=name) as record:
+        record['rows'] = 0
+        for chunk in read_source_csv(name, file_path, chunksize=state["chunk_size"]):
+            df = get_source_dataframe(name, chunk)
+            #Ids and dimensions are shared by all the sources
+            with state["lock"]:
+                df = add_chunk(df, state)
+            record['rows'] += len(df)
+            #Wait while the queue is full (unless the loader stopped)
+            while not state["stop"].is_set():
+                try:
+                    state["queue"].put(df, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+            if state["stop"].is_set():
+                break
+    return fetch_info
+
+def consume_chunks(state, futures):
+    """
+    Iterate over the chunks handed to the loader on the overlapped execution, until
+    all the producers finished and the queue is empty.
+
+    Args:
+        state (dict): Chunk state of the overlapped execution (see produce_chunks).
+        futures (list): Futures of the producers.
+
+    Raises:
+        RuntimeError: If a producer failed (then the load must not be committed).
+
+    Yields:
+        DataFrame: espacios_culturales chunks, in the order they were produced.
+    """
+    while True:
+        try:
+            yield state["queue"].get(timeout=0.1)
+        except queue.Empty:
+            #Chunks are put before its producer is done, so the queue is checked again
+            if all(future.done() for future in futures) and state["queue"].empty():
+                break
+        for future in futures:
+            if future.done() and (future.exception() or not future.result()):
+                raise RuntimeError('A source could not be fetched or processed.')
+
+def run_overlapped(sources, chunk_size=settings.overlap_chunk_size, max_chunks=settings.overlap_queue_size):
+    """
+    Fetch, process and load the sources with overlapped stages, so network, CPU and database
+    work at the same time: each source is parsed by chunks as soon as its download finishes
+    (on its own thread), and its espacios_culturales chunks are handed to the loader through
+    a bounded queue. While the queue is full the parsers wait, so memory usage is bounded by
+    the queue size instead of the size of the files.
+    The dimension and summary tables are loaded after all the chunks, in the same transaction. On PostgreSQL
+    the foreign keys are dropped while loading and restored at the end.
+    It's always a full load (the snapshot of incremental loads is discarded).
+
+    Args:
+        sources (dict): Dictionary with source names as keys and urls as values.
+        chunk_size (int, optional): Number of rows per chunk. Defaults to settings.overlap_chunk_size.
+        max_chunks (int, optional): Size of the queue, in chunks. Defaults to settings.overlap_queue_size.
+
+    Returns:
+        bool: True if all the sources were fetched and all the tables updated. False otherwise.
+    """
+    db = psql.get_database()
+    if not db:
+        return False
+    state = get_chunk_state()
+    state.update({
+        "queue" : queue.Queue(maxsize=max_chunks),
+        "lock" : threading.Lock(),
+        "stop" : threading.Event(),
+        "chunk_size" : chunk_size
+    })
+    #Load the metadata of previous downloads
+    fetch_cache = load_json_file(settings.fetch_cache_path)
+    data = None
+    loaded = False
+    constraints_dropped = False
+    #One producer per source
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        futures = [executor.submit(produce_chunks, name, url, fetch_cache.get(name), state)
+            for name, url in sources.items()]
+        try:
+            chunks = consume_chunks(state, futures)
+            #The dimension tables of the first chunk are needed to set up the tables
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                raise RuntimeError('No rows were processed.')
+            with state["lock"]:
+                data = get_chunked_data(state, get_chunk_schema(state))
+            if not set_up_database(data):
+                raise RuntimeError('Could not set up the database tables.')
+            if db.dialect.name == 'postgresql':
+                drop_foreign_keys(db, data)
+                constraints_dropped = True
+            with db.connect() as con:
+                with con.begin():
+                    #Load the chunks while they are produced
+                    psql.truncate_tables(con, ["espacios_culturales"])
+                    load_table(con, "espacios_culturales", itertools.chain([first_chunk], chunks))
+                    #Load the dimension and summary tables, complete now
+                    for df_name, df in get_chunked_data(state).items():
+                        psql.truncate_tables(con, [df_name])
+                        load_table(con, df_name, [df])
+            loaded = True
+        except Exception as e:
+            logger.log('ERROR', 'Can\'t update tables in database with overlapped stages.', str(e))
+        finally:
+            #Release the producers waiting on a full queue
+            state["stop"].set()
+        if constraints_dropped:
+            try:
+                restore_foreign_keys(db, data)
+            except Exception:
+                loaded = False
+    #Remember which sources changed, and update the cache with the successful downloads
+    save_fetch_results(fetch_cache, {name: future.result() if not future.exception() else None
+        for name, future in zip(sources.keys(), futures)})
+    #The snapshot of the last incremental load is outdated now (even if the load failed)
+    Path(settings.load_snapshot_path).unlink(missing_ok=True)
+    if loaded:
+        #Save the ids, so they are kept on future runs
+        save_row_ids(state["row_ids"])
+        save_json_file(state["id_mappings"], settings.id_mappings_path)
+        logger.log('INFO', f'Loaded {state["n_rows"]} rows with overlapped stages, in chunks of {chunk_size} rows.')
+    return loaded
+
+def run():
+    """
+    Run the program once: fetch the source files, process them and update the database
+    (with the execution mode set on .env file). The logger must be set up before.
+
+    Returns:
+        bool: True if the database was updated. False otherwise.
+    """
+    #Update the current datetime (used on the file paths), as the program may run for days
+    global now
+    now = dt.datetime.now()
+    #Fetch, process and load at the same time (if enabled on .env file)
+    if settings.overlapped:
+        with metrics.stage('overlapped'):
+            updated = run_overlapped(sources)
+        if not updated:
+            logger.log('ERROR', 'Could not fetch, process and load all the source files.')
+        else:
+            Path(settings.load_stamp_path).touch()
+        return updated
+    #If can get the data
+    chunks = None
+    with metrics.stage('fetch_all'):
+        fetched = get_source_files(sources)
+    if not fetched:
+        logger.log('ERROR', 'Could not get all the source files, database not updated.')
+        return False
+    #Nothing to do if no source changed since the last load
+    if not sources_changed():
+        logger.log('INFO', 'No source changed since the last load, database not updated.')
+        return False
+    #Process the data (in chunks, if a chunk size is set on .env file)
+    with metrics.stage('process'):
+        if settings.process_chunk_size:
+            processed_data, chunks = process_data_chunked()
+        else:
+            processed_data = process_data()
+    #Database set up and table creation
+    with metrics.stage('schema'):
+        db = set_up_database(processed_data)
+    if not db:
+        return False
+    #Update database
+    with metrics.stage('load_all'):
+        updated = update_database(db, processed_data, chunks)
+    #Remember that the current source files are loaded
+    if updated:
+        Path(settings.load_stamp_path).touch()
+    return updated
 
 def main():
     """
     Main function
     """
-    
+    #Start recording metrics (and profiling, if enabled on .env file)
+    metrics.start_run()
+
     #If can't validate the file paths from the .env file
-    if not validate_file_paths([
-        settings.default_data_path,
-        settings.default_log_path,
-        settings.default_sql_path]):
+    with metrics.stage('validate_paths'):
+        valid_paths = validate_settings_paths()
+    if not valid_paths:
         #Exit the program
-        print("Please check your path files on .env file. Quitting program...")
         quit()
     
     #Setup the logger
@@ -426,19 +2333,15 @@ def main():
     #Logging message
     logger.log('INFO', '--- STARTING PROGRAM ---')
 
-    #If can get the data
-    if get_source_files(sources):
-        #Process the data
-        processed_data = process_data()
-    #Database set up and table creation
-    db = set_up_database(processed_data)
-    #Update database
-    if db:
-        update_database(db, processed_data)
+    #Fetch, process and load
+    run()
+
+    #Stop recording metrics
+    metrics.end_run()
 
     #Logging message
     logger.log('INFO', '---- ENDING PROGRAM ----')
 
 #This is called when challenge.py is run directly
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,174 @@
+"""
+    This module runs the program as a daemon: a long-lived process that keeps the imported
+    modules and the database engine (with its connection pool) warm between runs, so each
+    run only does the actual work.
+    A run starts when the daemon starts, and then:
+    - Every DAEMON_INTERVAL seconds (counted from the end of the previous run).
+    - When triggered through the local socket (DAEMON_PORT on 127.0.0.1), sending 'run'.
+    - When the process receives SIGUSR1 (not available on Windows).
+    The local socket also answers 'status' with the timings of the last runs (as JSON), and
+    'stop' stops the daemon after the current run (as SIGINT and SIGTERM do).
+
+    Usage:
+        python src/daemon.py [--interval SECONDS] [--port PORT]
+        python src/daemon.py --send run|status|stop [--port PORT]
+"""
+
+#Imports
+#Daemon
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from collections import deque
+#Program modules (imported once, kept warm between runs)
+import challenge
+import psql
+import metrics
+#Logging module
+import logger
+#Settings module
+import settings
+
+#Set to start a run before the interval ends
+trigger = threading.Event()
+#Set to stop the daemon
+stop = threading.Event()
+#Set while a run is in progress
+running = threading.Event()
+#Timings of the last runs (most recent last)
+runs = deque(maxlen=settings.daemon_history)
+
+#Methods
+def run_once():
+    """
+    Run the program once (see challenge.run), recording its metrics, and keep its timings
+    (wall time of the run and of each stage) on 'runs'.
+    """
+    metrics.start_run()
+    running.set()
+    start = time.perf_counter()
+    try:
+        updated = challenge.run()
+    except Exception as e:
+        logger.log('ERROR', 'Run failed.', str(e))
+        updated = False
+    wall_time = time.perf_counter() - start
+    running.clear()
+    metrics.end_run()
+    #Wall time of each stage, by '<stage>[:<source or table>]'
+    stages = {}
+    for record in list(metrics.records):
+        key = record['stage'] + ''.join(f':{record[field]}' for field in ['source', 'table'] if field in record)
+        stages[key] = record['wall_time']
+    runs.append({'run_id': metrics.run_id, 'updated': updated, 'wall_time': round(wall_time, 6), 'stages': stages})
+    logger.log('INFO', f'Run {metrics.run_id} finished ({"database updated" if updated else "database not updated"}, '
+        f'{wall_time:.2f} seconds).')
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Handle a command sent through the local socket ('run', 'status' or 'stop'),
+    answering with a JSON line.
+    """
+    def handle(self):
+        command = self.rfile.readline().decode('utf_8').strip()
+        if command == 'run':
+            trigger.set()
+            response = {'triggered': True, 'running': running.is_set()}
+        elif command == 'status':
+            response = {'running': running.is_set(), 'runs': list(runs)}
+        elif command == 'stop':
+            stop.set()
+            trigger.set()
+            response = {'stopping': True}
+        else:
+            response = {'error': f'Unknown command "{command}"'}
+        self.wfile.write((json.dumps(response) + '\n').encode('utf_8'))
+
+def handle_signal(signum, frame):
+    """
+    Signal handler: SIGUSR1 triggers a run, other signals stop the daemon.
+    """
+    if signum != getattr(signal, 'SIGUSR1', None):
+        stop.set()
+    trigger.set()
+
+def serve(interval=settings.daemon_interval, port=settings.daemon_port):
+    """
+    Run the daemon until it's stopped.
+
+    Args:
+        interval (int, optional): Seconds between runs. Defaults to settings.daemon_interval.
+        port (int, optional): Port of the local socket, 0 to disable it. Defaults to settings.daemon_port.
+    """
+    #Listen to commands on the local socket
+    server = None
+    if port:
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', port), CommandHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    #Listen to signals
+    for signal_name in ['SIGINT', 'SIGTERM', 'SIGUSR1']:
+        if hasattr(signal, signal_name):
+            signal.signal(getattr(signal, signal_name), handle_signal)
+    #Create the database engine and its connection pool once
+    psql.get_database()
+    logger.log('INFO', f'Daemon started (runs every {interval} seconds'
+        f'{f", commands on port {port}" if port else ""}).')
+    while not stop.is_set():
+        #Triggers received during the run start another one
+        trigger.clear()
+        run_once()
+        trigger.wait(timeout=interval)
+    if server:
+        server.shutdown()
+    logger.log('INFO', 'Daemon stopped.')
+
+def send(command, port=settings.daemon_port):
+    """
+    Send a command to a running daemon through its local socket.
+
+    Args:
+        command (str): 'run', 'status' or 'stop'.
+        port (int, optional): Port of the local socket. Defaults to settings.daemon_port.
+
+    Returns:
+        dict: The daemon response.
+    """
+    with socket.create_connection(('127.0.0.1', port), timeout=10) as connection:
+        connection.sendall((command + '\n').encode('utf_8'))
+        with connection.makefile('r', encoding='utf_8') as file:
+            return json.loads(file.readline())
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Run the program as a daemon, or send it a command.')
+    parser.add_argument('--interval', type=int, default=settings.daemon_interval, help='seconds between runs')
+    parser.add_argument('--port', type=int, default=settings.daemon_port, help='port of the local socket (0 to disable it)')
+    parser.add_argument('--send', choices=['run', 'status', 'stop'], help='send a command to a running daemon')
+    args = parser.parse_args()
+
+    #Send a command
+    if args.send:
+        print(json.dumps(send(args.send, args.port), indent=2))
+        return
+
+    #If can't validate the file paths from the .env file
+    if not challenge.validate_settings_paths():
+        #Exit the program
+        sys.exit(1)
+    #Setup the logger
+    logger.setup()
+    logger.log('INFO', '--- STARTING DAEMON ---')
+    serve(args.interval, args.port)
+    logger.log('INFO', '---- ENDING DAEMON ----')
+
+#This is called when daemon.py is run directly
+if __name__ == "__main__":
+    main()
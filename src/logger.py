@@ -39,13 +39,14 @@ def log(level_name, msg, exc_info=""):
     Log a message with an given level.
 
     Args:
-        level_name (str): A string representing a log level: 'INFO', 'ERROR' or 'DEBUG'.
+        level_name (str): A string representing a log level: 'INFO', 'WARNING', 'ERROR' or 'DEBUG'.
         msg (str): Message to log.
-        exc_info (str, optional): Exception message, only if level_name = 'ERROR'. Defaults to "".
+        exc_info (str, optional): Exception message, only if level_name = 'WARNING' or 'ERROR'. Defaults to "".
     """
     #Get the level
     match level_name:
         case 'INFO' : level = logging.INFO
+        case 'WARNING' : level = logging.WARNING
         case 'ERROR' : level = logging.ERROR
         case 'DEBUG' : level = logging.DEBUG
         case _: level = logging.INFO
@@ -0,0 +1,115 @@
+"""
+    This module records metrics of the program stages.
+    Each stage is timed (wall and CPU time) and its metrics (like rows or bytes) are
+    appended as a JSON line to the metrics file specified in the settings .env file.
+    It can also profile the whole run with cProfile, and trace the peak memory
+    of each stage with tracemalloc (both switchable from the .env file).
+"""
+
+#Imports
+#Metrics
+import time
+import json
+import cProfile
+import tracemalloc
+import threading
+import datetime as dt
+from contextlib import contextmanager
+#Settings module
+import settings
+#Logger module
+import logger
+
+#Id of the current run (its start datetime)
+run_id = None
+#cProfile profiler of the current run
+profiler = None
+#Lock to write the metrics file from different threads
+lock = threading.Lock()
+#Stages running on each thread (to propagate peak memory to outer stages)
+running_stages = threading.local()
+#Records of the current run
+records = []
+
+#Methods
+def start_run():
+    """
+    Start recording a new run. Starts the cProfile profiler and tracemalloc if
+    they are enabled on settings.
+    """
+    global run_id, profiler
+    run_id = dt.datetime.now().isoformat(timespec='seconds')
+    records.clear()
+    if settings.trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if settings.profile_cpu:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+def end_run():
+    """
+    End recording the current run. Saves the cProfile stats (if enabled) on settings.profile_path.
+    """
+    global profiler
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(settings.profile_path)
+        logger.log('INFO', f'Profile stats saved on: "{settings.profile_path}"')
+        profiler = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Context manager that records the metrics of a stage: wall time, CPU time (of the whole
+    process), peak memory (only if tracemalloc is enabled) and any other field given or
+    added to the yielded record (like 'rows' or 'bytes').
+    The record is appended to settings.metrics_path when the stage ends, even if it fails.
+
+    Args:
+        name (str): Stage name (like 'fetch' or 'load').
+        **fields: Other fields of the record (like 'source' or 'table').
+
+    Yields:
+        dict: The stage record, where metrics can be added.
+    """
+    record = {'run_id': run_id, 'stage': name, **fields}
+    #Stages running on this thread
+    stack = running_stages.__dict__.setdefault('stack', [])
+    stack.append(record)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = str(e)
+        raise
+    finally:
+        record['wall_time'] = round(time.perf_counter() - start_wall, 6)
+        record['cpu_time'] = round(time.process_time() - start_cpu, 6)
+        stack.pop()
+        if tracing and tracemalloc.is_tracing():
+            #Peak since the stage started (or since its last inner stage ended)
+            record['peak_memory'] = max(tracemalloc.get_traced_memory()[1], record.pop('_inner_peak', 0))
+            if stack:
+                stack[-1]['_inner_peak'] = max(stack[-1].get('_inner_peak', 0), record['peak_memory'])
+        save(record)
+
+def save(record):
+    """
+    Append a record as a JSON line to the metrics file (and to the records of the current run).
+
+    Args:
+        record (dict): Record to save.
+    """
+    try:
+        with lock:
+            records.append(record)
+            with open(settings.metrics_path, 'a', encoding='utf_8') as file:
+                file.write(json.dumps(record, default=str) + '\n')
+    except Exception as e:
+        logger.log('ERROR', f'Failed to save metrics on "{settings.metrics_path}"', str(e))
@@ -0,0 +1,211 @@
+"""
+    This module runs the program as a pipeline of stages that can be invoked separately:
+    - fetch: download the source .csv files.
+    - process: process them, saving the processed data to a file.
+    - schema: create (or update) the database tables, saving the .sql file.
+    - load: update the database tables with the processed data.
+    Each stage declares its input and output files (artifacts). Like make, a stage is skipped
+    when all its outputs exist and are newer than all its inputs, unless it's forced.
+    If a stage fails, the next ones are not run. If the fetch stage runs and no source changed
+    since the last load, the next ones are not run either.
+
+    Usage:
+        python src/pipeline.py [fetch] [process] [schema] [load] [--force]
+"""
+
+#Imports
+#Files and arguments
+import os
+import sys
+import argparse
+from pathlib import Path
+#Data manipulation
+import pandas as pd
+#Program modules
+import challenge
+import psql
+import metrics
+#Logging module
+import logger
+#Settings module
+import settings
+
+#Methods
+def get_source_paths():
+    """
+    Get the paths of the source .csv files of the current date (its reference files, if they
+    were moved to the downloaded files store). The blobs are not used, as its modification
+    time is the first time its content was stored, while the reference files are saved
+    on each download.
+
+    Returns:
+        list: File paths.
+    """
+    file_paths = []
+    for name in challenge.sources.keys():
+        file_path = challenge.get_source_file_path(name)
+        if not os.path.exists(file_path) and os.path.exists(file_path + '.ref'):
+            file_path += '.ref'
+        file_paths.append(file_path)
+    return file_paths
+
+def load_processed_data():
+    """
+    Load the processed data saved by the process stage.
+
+    Returns:
+        tuple: Dictionary with table names as keys and DataFrames as values, and dictionary
+            with table names as keys and iterators over its chunks as values (None if the
+            data was not processed by chunks).
+    """
+    processed = pd.read_pickle(settings.processed_data_path)
+    chunks = None
+    if processed['spool_path']:
+        chunks = {"espacios_culturales" : challenge.read_spool(processed['spool_path'])}
+    return processed['data'], chunks
+
+def fetch():
+    """
+    Fetch stage: download the source files.
+
+    Returns:
+        bool: True if all the files were downloaded. False otherwise.
+    """
+    return challenge.get_source_files(challenge.sources)
+
+def process():
+    """
+    Process stage: process the source files (in chunks, if a chunk size is set on .env file)
+    and save the processed data on settings.processed_data_path.
+
+    Returns:
+        bool: True (exceptions are raised).
+    """
+    if settings.process_chunk_size:
+        data, _ = challenge.process_data_chunked()
+        spool_path = settings.spool_path
+    else:
+        data = challenge.process_data()
+        spool_path = None
+    pd.to_pickle({'data': data, 'spool_path': spool_path}, settings.processed_data_path)
+    return True
+
+def schema():
+    """
+    Schema stage: create (or update) the database tables from the processed data.
+    If they can't be created, the .sql file is removed (see challenge.set_up_database),
+    so the stage is not taken as up to date on the next run.
+
+    Returns:
+        bool: True if connected to the database and the tables were created or updated. False otherwise.
+    """
+    data, _ = load_processed_data()
+    return challenge.set_up_database(data) is not None
+
+def load():
+    """
+    Load stage: update the database tables with the processed data, and touch
+    settings.load_stamp_path when done.
+
+    Returns:
+        bool: True if all the tables were updated. False otherwise.
+    """
+    data, chunks = load_processed_data()
+    db = psql.db or psql.get_database()
+    if not db or not challenge.update_database(db, data, chunks):
+        return False
+    Path(settings.load_stamp_path).touch()
+    return True
+
+#Stages (in order) with its function, and functions returning its input and output files
+stages = {
+    "fetch" : (fetch, lambda: [], get_source_paths),
+    "process" : (process, get_source_paths, lambda: [settings.processed_data_path]),
+    "schema" : (schema, lambda: [settings.processed_data_path], lambda: [settings.default_sql_path]),
+    "load" : (load, lambda: [settings.processed_data_path, settings.default_sql_path],
+        lambda: [settings.load_stamp_path])
+}
+
+def is_up_to_date(inputs, outputs):
+    """
+    Check if a stage is up to date: all its outputs exist and are newer than all its inputs.
+
+    Args:
+        inputs (list): Input file paths.
+        outputs (list): Output file paths.
+
+    Returns:
+        bool: True if the stage is up to date. False otherwise.
+    """
+    if not all(os.path.exists(path) for path in outputs):
+        return False
+    if not all(os.path.exists(path) for path in inputs):
+        return False
+    oldest_output = min(os.path.getmtime(path) for path in outputs)
+    return all(os.path.getmtime(path) <= oldest_output for path in inputs)
+
+def run(stage_names=stages.keys(), force=False):
+    """
+    Run some stages of the pipeline, in order, skipping the ones that are up to date.
+
+    Args:
+        stage_names (list, optional): Names of the stages to run. Defaults to all the stages.
+        force (bool, optional): Run the stages even if they are up to date. Defaults to False.
+
+    Returns:
+        bool: True if all the stages were run (or skipped) successfully. False otherwise.
+    """
+    for name, (function, inputs, outputs) in stages.items():
+        if name not in stage_names:
+            continue
+        #Skip the stage if it's up to date
+        if not force and is_up_to_date(inputs(), outputs()):
+            logger.log('INFO', f'Stage "{name}" is up to date, skipped.')
+            continue
+        #Run the stage
+        logger.log('INFO', f'Running stage "{name}"')
+        with metrics.stage(name) as record:
+            try:
+                done = function()
+            except Exception as e:
+                logger.log('ERROR', f'Stage "{name}" failed.', str(e))
+                record['error'] = str(e)
+                done = False
+        if not done:
+            logger.log('ERROR', f'Stage "{name}" failed, stopping the pipeline.')
+            return False
+        #Nothing else to do if no source changed since the last load
+        if name == "fetch" and not force and not challenge.sources_changed():
+            logger.log('INFO', 'No source changed since the last load, the next stages are skipped.')
+            return True
+    return True
+
+def main():
+    """
+    Main function
+    """
+    parser = argparse.ArgumentParser(description='Run the stages of the pipeline that are not up to date.')
+    parser.add_argument('stages', nargs='*', metavar='stage',
+                        help=f'stages to run: {", ".join(stages.keys())} (all of them by default)')
+    parser.add_argument('--force', action='store_true', help='run the stages even if they are up to date')
+    args = parser.parse_args()
+    for name in args.stages:
+        if name not in stages:
+            parser.error(f'invalid stage: "{name}"')
+
+    #If can't validate the file paths from the .env file
+    if not challenge.validate_settings_paths():
+        #Exit the program
+        sys.exit(1)
+    #Setup the logger and start recording metrics
+    logger.setup()
+    metrics.start_run()
+    logger.log('INFO', '--- STARTING PIPELINE ---')
+    done = run(args.stages or stages.keys(), args.force)
+    metrics.end_run()
+    logger.log('INFO', '---- ENDING PIPELINE ----')
+    sys.exit(0 if done else 1)
+
+#This is called when pipeline.py is run directly
+if __name__ == "__main__":
+    main()
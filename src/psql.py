@@ -6,8 +6,11 @@
 """
 
 #Imports
+#In-memory buffers
+import io
+import json
 #Database conection
-from sqlalchemy import create_engine, text, types
+from sqlalchemy import create_engine, text, types, bindparam, inspect
 from sqlalchemy_utils import database_exists, create_database
 #Settings module
 import settings
@@ -20,11 +23,16 @@ db = None
 #Methods
 def get_database():
     """
-    Connects to database.
+    Connects to database. The engine (and its connection pool) is created once,
+    and reused on later calls.
 
     Returns:
         engine (Engine): Database engine or None if failed to connect.
     """
+    global db
+    #Reuse the engine if already connected
+    if db is not None:
+        return db
     #Try to connect to database, if cant, raise an exception. Log both cases
     try:
         engine = get_engine_from_settings()
@@ -33,7 +41,6 @@ def get_database():
         logger.log('ERROR', f'Failed to connect to "{settings.pg_database}"', str(e))
         return None
     #Remember the engine
-    global db
     db = engine
     #Return the engine
     return engine
@@ -66,7 +73,8 @@ def get_engine(user, passwd, host, port, db):
     url = 'postgresql://{user}:{passwd}@{host}:{port}/{db}'.format(
         user=user, passwd=passwd, host=host, port=port, db=db)
     #Create the engine
-    engine = create_engine(url, pool_size=50, echo=False)
+    #(connections are checked before being used, as the pool may be kept for a long time)
+    engine = create_engine(url, pool_size=50, pool_pre_ping=True, echo=False)
     #Look for existing database 
     if database_exists(url):
         logger.log('INFO', f'Database "{db}" found!')
@@ -95,12 +103,17 @@ def get_dtypes_dict(df):
     #Initialize empty dict
     dtypes_dict = {}
     #Update its values
+    #(compact dtypes keep the SQL type of the column they replace: categoricals take the type
+    # of its categories, strings are VARCHAR and downcast integers are still INT or BIGINT)
     for col_name, col_type in zip(df.columns, df.dtypes):
-        if "object" in str(col_type):
+        if str(col_type) == "category":
+            col_type = col_type.categories.dtype
+
+        if "object" in str(col_type) or "string" in str(col_type):
             dtypes_dict.update({col_name: types.VARCHAR(length=255)})
                                  
         if "datetime" in str(col_type):
-            dtypes_dict.update({col_name: 'TIMESTAMP WITHOUT TIME ZONE'})
+            dtypes_dict.update({col_name: types.TIMESTAMP(timezone=False)})
 
         if "float" in str(col_type):
             dtypes_dict.update({col_name: types.Float(precision=3, asdecimal=True)})
@@ -109,7 +122,7 @@ def get_dtypes_dict(df):
             dtypes_dict.update({col_name: types.INT()})
 
         if "Int" in str(col_type):
-            dtypes_dict.update({col_name: 'BIGINT'})
+            dtypes_dict.update({col_name: types.BIGINT()})
 
         if "bool" in str(col_type):
             dtypes_dict.update({col_name: types.BOOLEAN()})
@@ -128,3 +141,200 @@ def execute_from_sql(sql_file):
         with open(sql_file, 'r') as file:
             query = text(file.read())
             con.execute(query)
+
+def execute_statements(statements):
+    """
+    Execute some SQL statements on 'db' database, in one transaction.
+
+    Args:
+        statements (list): SQL statements (str).
+    """
+    with db.connect() as con:
+        with con.begin():
+            for statement in statements:
+                con.execute(text(statement))
+
+def get_missing_tables(table_names):
+    """
+    Look for tables that don't exist on 'db' database.
+
+    Args:
+        table_names (list): Names of the tables.
+
+    Returns:
+        list: Names of the tables that don't exist.
+    """
+    existing_tables = inspect(db).get_table_names()
+    return [table_name for table_name in table_names if table_name not in existing_tables]
+
+def get_schema_metadata():
+    """
+    Get the fingerprint of the schema of 'db' database, and the statements that
+    created it, from the 'schema_metadata' table.
+
+    Returns:
+        tuple: The fingerprint (str) and the statements (list). (None, []) if there is no schema metadata.
+    """
+    with db.connect() as con:
+        with con.begin():
+            con.execute('CREATE TABLE IF NOT EXISTS schema_metadata '
+                        '(fingerprint VARCHAR(64) PRIMARY KEY, statements TEXT, fecha_carga TIMESTAMP WITHOUT TIME ZONE);')
+            row = con.execute('SELECT fingerprint, statements FROM schema_metadata LIMIT 1;').fetchone()
+    if row is None:
+        return None, []
+    return row[0], json.loads(row[1])
+
+def save_schema_metadata(fingerprint, statements):
+    """
+    Save the fingerprint of the schema of 'db' database, and the statements that
+    created it, on the 'schema_metadata' table (replacing the previous ones).
+
+    Args:
+        fingerprint (str): Schema fingerprint.
+        statements (list): SQL statements (str).
+    """
+    with db.connect() as con:
+        with con.begin():
+            con.execute('DELETE FROM schema_metadata;')
+            con.execute(text('INSERT INTO schema_metadata (fingerprint, statements, fecha_carga) '
+                             'VALUES (:fingerprint, :statements, CURRENT_TIMESTAMP);'),
+                        {'fingerprint': fingerprint, 'statements': json.dumps(statements)})
+
+def clear_schema_metadata():
+    """
+    Remove the schema fingerprint of 'db' database, so the whole SQL script
+    is executed again by the next schema set up.
+    """
+    with db.connect() as con:
+        with con.begin():
+            con.execute('DELETE FROM schema_metadata;')
+
+def truncate_tables(con, table_names):
+    """
+    Remove all the rows of some tables (and of the tables referencing them).
+    Uses TRUNCATE ... CASCADE on PostgreSQL, and DELETE on other databases
+    (tables are emptied in reverse order, children first).
+
+    Args:
+        con (Connection): Database connection.
+        table_names (list): Names of the tables.
+    """
+    if con.dialect.name == 'postgresql':
+        con.execute('TRUNCATE {tables} CASCADE;'.format(tables=', '.join(table_names)))
+    else:
+        for table_name in reversed(list(table_names)):
+            con.execute(f'DELETE FROM {table_name};')
+
+def attach_partition(con, table_name, partition_name, column, lower, upper):
+    """
+    Attach a table as a range partition of a partitioned table (PostgreSQL).
+    A CHECK constraint matching the bounds is added first, so attaching doesn't scan
+    the partition rows, and it's dropped after it.
+
+    Args:
+        con (Connection): Database connection (PostgreSQL).
+        table_name (str): Name of the partitioned table.
+        partition_name (str): Name of the table to attach.
+        column (str): Partition key column.
+        lower (datetime): Lower bound (included).
+        upper (datetime): Upper bound (excluded).
+    """
+    lower, upper = f"'{lower.isoformat(sep=' ')}'", f"'{upper.isoformat(sep=' ')}'"
+    con.execute(f'ALTER TABLE {partition_name} ADD CONSTRAINT {partition_name}_bounds '
+                f'CHECK ({column} IS NOT NULL AND {column} >= {lower} AND {column} < {upper});')
+    con.execute(f'ALTER TABLE {table_name} ATTACH PARTITION {partition_name} FOR VALUES FROM ({lower}) TO ({upper});')
+    con.execute(f'ALTER TABLE {partition_name} DROP CONSTRAINT {partition_name}_bounds;')
+
+def get_partitions(con, table_name):
+    """
+    Get the names of the partitions of a partitioned table (PostgreSQL).
+
+    Args:
+        con (Connection): Database connection (PostgreSQL).
+        table_name (str): Name of the partitioned table.
+
+    Returns:
+        list: Partition names, sorted.
+    """
+    result = con.execute(text('SELECT c.relname FROM pg_inherits i '
+                              'JOIN pg_class c ON c.oid = i.inhrelid '
+                              'JOIN pg_class p ON p.oid = i.inhparent '
+                              'WHERE p.relname = :table_name ORDER BY c.relname'), {'table_name': table_name})
+    return [row[0] for row in result]
+
+def copy_from_dataframe(con, df, table_name):
+    """
+    Bulk load a DataFrame into an existing PostgreSQL table, streaming it
+    as csv from an in-memory buffer with COPY FROM STDIN.
+
+    Args:
+        con (Connection): Database connection (PostgreSQL).
+        df (DataFrame): Data to load. Its columns must exist in the table.
+        table_name (str): Name of the table.
+    """
+    #Write the dataframe as csv (null values as empty fields) on a buffer
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    #Stream the buffer to the table, using the raw psycopg2 cursor
+    columns = ', '.join(df.columns)
+    with con.connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def load_dataframe(con, df, table_name):
+    """
+    Append a DataFrame to an existing table. Uses COPY on PostgreSQL,
+    and 'to_sql' (with the types from get_dtypes_dict) on other databases.
+
+    Args:
+        con (Connection): Database connection.
+        df (DataFrame): Data to load.
+        table_name (str): Name of the table.
+    """
+    if con.dialect.name == 'postgresql':
+        copy_from_dataframe(con, df, table_name)
+    else:
+        df.to_sql(table_name, con=con, if_exists="append", index=False, dtype=get_dtypes_dict(df))
+
+def upsert_dataframe(con, df, table_name, pk):
+    """
+    Insert the rows of a DataFrame into an existing table, updating the rows
+    whose primary key already exists. On PostgreSQL the rows are copied to a temporary
+    staging table and merged with INSERT ... ON CONFLICT DO UPDATE.
+    Must be called inside a transaction.
+
+    Args:
+        con (Connection): Database connection.
+        df (DataFrame): Rows to insert or update.
+        table_name (str): Name of the table.
+        pk (str): Name of the primary key column.
+    """
+    if con.dialect.name == 'postgresql':
+        #Copy the rows to a staging table (dropped at the end of the transaction)
+        staging_table = f'{table_name}_staging'
+        con.execute(f'CREATE TEMP TABLE {staging_table} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP;')
+        copy_from_dataframe(con, df, staging_table)
+        #Merge them into the table
+        columns = ', '.join(df.columns)
+        updates = ', '.join(f'{col} = EXCLUDED.{col}' for col in df.columns if col != pk)
+        con.execute(f'INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging_table} '
+                    f'ON CONFLICT ({pk}) DO UPDATE SET {updates};')
+    else:
+        #Delete the existing rows and insert them again
+        delete_rows(con, table_name, pk, df[pk].tolist())
+        load_dataframe(con, df, table_name)
+
+def delete_rows(con, table_name, pk, ids, batch_size=1000):
+    """
+    Delete rows from a table by its primary key, in batches.
+
+    Args:
+        con (Connection): Database connection.
+        table_name (str): Name of the table.
+        pk (str): Name of the primary key column.
+        ids (list): Primary keys of the rows to delete.
+        batch_size (int, optional): Number of rows deleted per statement. Defaults to 1000.
+    """
+    query = text(f'DELETE FROM {table_name} WHERE {pk} IN :ids').bindparams(bindparam('ids', expanding=True))
+    for i in range(0, len(ids), batch_size):
+        con.execute(query, {'ids': ids[i:i + batch_size]})
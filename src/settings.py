@@ -20,4 +20,60 @@ url_bibliotecas = config('URL_BIBLIOTECAS')
 #Path files
 default_data_path = config('DEFAULT_DATA_PATH', default='data')
 default_sql_path = config('DEFAULT_SQL_PATH', default='tables.sql')
-default_log_path = config('DEFAULT_LOG_PATH', default='db.log')
\ No newline at end of file
+default_log_path = config('DEFAULT_LOG_PATH', default='db.log')
+
+#Downloads
+download_workers = config('DOWNLOAD_WORKERS', cast=int, default='3')
+download_chunk_size = config('DOWNLOAD_CHUNK_SIZE', cast=int, default='1048576')
+download_connect_timeout = config('DOWNLOAD_CONNECT_TIMEOUT', cast=float, default='10')
+download_read_timeout = config('DOWNLOAD_READ_TIMEOUT', cast=float, default='60')
+download_retries = config('DOWNLOAD_RETRIES', cast=int, default='5')
+download_backoff = config('DOWNLOAD_BACKOFF', cast=float, default='1')
+download_max_backoff = config('DOWNLOAD_MAX_BACKOFF', cast=float, default='60')
+fetch_cache_path = config('FETCH_CACHE_PATH', default=default_data_path + '\\fetch_cache.json')
+blob_store_path = config('BLOB_STORE_PATH', default=default_data_path + '\\blobs')
+blob_compression = config('BLOB_COMPRESSION', default='gzip')
+
+#Processing
+id_mappings_path = config('ID_MAPPINGS_PATH', default=default_data_path + '\\id_mappings.json')
+row_ids_path = config('ROW_IDS_PATH', default=default_data_path + '\\row_ids.pkl')
+process_chunk_size = config('PROCESS_CHUNK_SIZE', cast=int, default='0')
+processed_data_path = config('PROCESSED_DATA_PATH', default=default_data_path + '\\processed_data.pkl')
+spool_path = config('SPOOL_PATH', default=default_data_path + '\\espacios_culturales.spool')
+csv_engine = config('CSV_ENGINE', default='auto')
+process_workers = config('PROCESS_WORKERS', cast=int, default='1')
+compact_dtypes = config('COMPACT_DTYPES', cast=bool, default='True')
+category_max_ratio = config('CATEGORY_MAX_RATIO', cast=float, default='0.5')
+
+#Overlapped execution
+overlapped = config('OVERLAPPED', cast=bool, default='False')
+overlap_chunk_size = config('OVERLAP_CHUNK_SIZE', cast=int, default='100000')
+overlap_queue_size = config('OVERLAP_QUEUE_SIZE', cast=int, default='4')
+
+#Processed data cache
+processed_cache_path = config('PROCESSED_CACHE_PATH', default=default_data_path + '\\processed_cache')
+processed_cache_max_size = config('PROCESSED_CACHE_MAX_SIZE', cast=int, default='500')
+processed_cache_max_age = config('PROCESSED_CACHE_MAX_AGE', cast=int, default='30')
+
+#Database load
+load_mode = config('LOAD_MODE', default='full')
+load_workers = config('LOAD_WORKERS', cast=int, default='1')
+defer_constraints_min_rows = config('DEFER_CONSTRAINTS_MIN_ROWS', cast=int, default='100000')
+load_stamp_path = config('LOAD_STAMP_PATH', default=default_data_path + '\\load.stamp')
+load_snapshot_path = config('LOAD_SNAPSHOT_PATH', default=default_data_path + '\\load_snapshot.pkl')
+snapshot_retention = config('SNAPSHOT_RETENTION', cast=int, default='365')
+
+#Metrics and profiling
+metrics_path = config('METRICS_PATH', default='metrics.jsonl')
+profile_cpu = config('PROFILE_CPU', cast=bool, default='False')
+profile_path = config('PROFILE_PATH', default='profile.prof')
+trace_memory = config('TRACE_MEMORY', cast=bool, default='False')
+
+#Daemon
+daemon_interval = config('DAEMON_INTERVAL', cast=int, default='86400')
+daemon_port = config('DAEMON_PORT', cast=int, default='8765')
+daemon_history = config('DAEMON_HISTORY', cast=int, default='20')
+
+#Benchmark
+benchmark_database = config('BENCHMARK_DATABASE', default='db_benchmark')
+benchmark_baseline_path = config('BENCHMARK_BASELINE_PATH', default='benchmark_baseline.json')
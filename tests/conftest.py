@@ -0,0 +1,86 @@
+"""
+    Shared test set up: the program modules live on src/ and import each other as
+    top-level modules, and the download tests use a local HTTP server.
+"""
+
+#Imports
+import sys
+import time
+import hashlib
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+#Tests
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+#Classes
+class SourceHandler(BaseHTTPRequestHandler):
+    """
+    Serve the files of 'server.files' (url paths as keys, contents as bytes as values) with an
+    ETag, answering conditional (If-None-Match) and resumed (Range and If-Range) requests.
+    The first 'server.cuts[path]' responses of a path are cut after half of its body.
+    Each response waits 'server.delay' seconds, and the maximum number of requests handled
+    at the same time is kept on 'server.max_active'.
+    The headers of each request are appended to 'server.requests' as (path, headers) tuples.
+    """
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers)))
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delay)
+            self.send_content()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def send_content(self):
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        #Resume from the requested byte, only if the content is still the same
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range', etag) == etag:
+            start = int(self.headers['Range'].split('=')[1].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')
+        else:
+            self.send_response(200)
+        body = content[start:]
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        #Cut the response, closing the connection
+        if self.server.cuts.get(self.path):
+            self.server.cuts[self.path] -= 1
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+#Fixtures
+@pytest.fixture
+def server():
+    """
+    Local HTTP server (see SourceHandler), running on its own thread during the test.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SourceHandler)
+    server.files, server.cuts, server.requests = {}, {}, []
+    server.delay, server.active, server.max_active, server.lock = 0, 0, 0, threading.Lock()
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,60 @@
+"""
+    Tests of the resumable downloads (challenge.save_csv_from_url) against a local HTTP server
+    that cuts its responses short.
+"""
+
+#Imports
+import os
+import hashlib
+from pathlib import Path
+#Tests
+import pytest
+#Program modules
+import challenge
+
+#Content served (a fixture source file, repeated to span many download chunks)
+content = (Path(__file__).resolve().parent / 'fixtures' / 'museos.csv').read_bytes() * 200
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """
+    Retry the downloads without waiting.
+    """
+    monkeypatch.setattr(challenge, 'get_backoff_delay', lambda attempt: 0)
+
+def test_resume_after_cut(server, tmp_path):
+    server.files['/museos.csv'] = content
+    server.cuts['/museos.csv'] = 1
+    file_path = str(tmp_path / 'museos.csv')
+    fetch_info = challenge.save_csv_from_url(server.url + '/museos.csv', file_path, chunk_size=1024, retries=2)
+    #The second request only asks for the bytes not received (up to half of them, the last ones
+    #read before the cut may not be written), if the content is the same
+    assert len(server.requests) == 2
+    _, headers = server.requests[1]
+    resume_from = int(headers['Range'].removeprefix('bytes=').removesuffix('-'))
+    assert 0 < resume_from <= len(content) // 2
+    assert headers['If-Range'] == fetch_info['etag']
+    #The file is complete and its checksum is the one of the served content
+    assert Path(file_path).read_bytes() == content
+    assert fetch_info['sha256'] == hashlib.sha256(content).hexdigest()
+    assert fetch_info['bytes'] == len(content)
+    assert not os.path.exists(file_path + '.part')
+    assert not os.path.exists(file_path + '.part.json')
+
+def test_restart_when_content_changed(server, tmp_path):
+    server.files['/museos.csv'] = content
+    server.cuts['/museos.csv'] = 1
+    file_path = str(tmp_path / 'museos.csv')
+    #Cut the first response, and change the content before retrying
+    with pytest.raises(Exception) as e:
+        challenge.save_csv_from_url(server.url + '/museos.csv', file_path, chunk_size=1024, retries=0)
+    assert challenge.is_retryable(e.value)
+    assert os.path.getsize(file_path + '.part') > 0
+    new_content = content.replace(b'Museo', b'Museum')
+    server.files['/museos.csv'] = new_content
+    fetch_info = challenge.save_csv_from_url(server.url + '/museos.csv', file_path, chunk_size=1024, retries=0)
+    #If-Range doesn't match: the whole new content is downloaded again
+    _, headers = server.requests[1]
+    assert 'Range' in headers
+    assert Path(file_path).read_bytes() == new_content
+    assert fetch_info['sha256'] == hashlib.sha256(new_content).hexdigest()
@@ -0,0 +1,79 @@
+"""
+    Tests of the concurrent fetch of the source files (challenge.get_source_files), served
+    from the fixture source files by a local HTTP server.
+"""
+
+#Imports
+import datetime as dt
+from pathlib import Path
+#Tests
+import pytest
+#Program modules
+import challenge
+import metrics
+import settings
+
+fixtures_path = Path(__file__).resolve().parent / 'fixtures'
+
+@pytest.fixture
+def sources(server, tmp_path, monkeypatch):
+    """
+    Serve the fixture source files, and save the downloads and its metadata on a temporary folder.
+
+    Returns:
+        dict: Source names as keys, and its local urls as values.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(challenge, 'cwd', '.')
+    monkeypatch.setattr(challenge, 'now', dt.datetime(2022, 6, 1))
+    monkeypatch.setattr(settings, 'default_data_path', 'data')
+    monkeypatch.setattr(settings, 'fetch_cache_path', str(tmp_path / 'fetch_cache.json'))
+    monkeypatch.setattr(settings, 'load_stamp_path', str(tmp_path / 'load.stamp'))
+    monkeypatch.setattr(settings, 'metrics_path', str(tmp_path / 'metrics.jsonl'))
+    monkeypatch.setattr(settings, 'blob_store_path', '')
+    for name in challenge.sources.keys():
+        server.files[f'/{name}.csv'] = (fixtures_path / f'{name}.csv').read_bytes()
+    metrics.start_run()
+    return {name: f'{server.url}/{name}.csv' for name in challenge.sources.keys()}
+
+def get_fetch_records():
+    """
+    Get the metrics recorded for each source download.
+
+    Returns:
+        dict: Source names as keys, and its fetch records as values.
+    """
+    return {record['source']: record for record in metrics.records if record['stage'] == 'fetch'}
+
+def test_concurrent_fetch(server, sources):
+    server.delay = 0.3
+    assert challenge.get_source_files(sources, max_workers=len(sources))
+    #All the sources were requested at the same time
+    assert server.max_active == len(sources)
+    #Each source is saved, and reported with its bytes and download time
+    records = get_fetch_records()
+    for name in sources.keys():
+        content = (fixtures_path / f'{name}.csv').read_bytes()
+        assert Path(challenge.get_source_file_path(name, challenge.cwd)).read_bytes() == content
+        assert records[name]['bytes'] == len(content)
+        assert records[name]['wall_time'] >= server.delay
+        assert challenge.changed_sources[name]
+
+def test_max_workers(server, sources):
+    assert challenge.get_source_files(sources, max_workers=1)
+    assert server.max_active == 1
+
+def test_not_modified(server, sources):
+    assert challenge.get_source_files(sources)
+    #(as if the first fetch was loaded)
+    Path(settings.load_stamp_path).touch()
+    metrics.start_run()
+    assert challenge.get_source_files(sources)
+    #The second fetch is conditional, and the bodies are not downloaded again
+    for _, headers in server.requests[len(sources):]:
+        assert 'If-None-Match' in headers
+    records = get_fetch_records()
+    for name in sources.keys():
+        assert records[name]['bytes'] == 0
+        assert not challenge.changed_sources[name]
+    assert not challenge.sources_changed()
@@ -0,0 +1,116 @@
+"""
+    Regression tests of the processing stage: process_data (and process_data_chunked) on the
+    fixture source files (tests/fixtures) must give the tables stored on tests/expected, and
+    normalize_dataframe the same values as its previous row-wise version (benchmark.py).
+    To update the expected tables after an intended change of the output, run:
+        python tests/test_process_data.py
+"""
+
+#Imports
+import sys
+import shutil
+import datetime as dt
+from pathlib import Path
+#Data manipulation
+import pandas as pd
+#Tests
+import pytest
+#Program modules (src/ is also added to the path when this file is run directly)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+import challenge
+import benchmark
+import settings
+
+fixtures_path = Path(__file__).resolve().parent / 'fixtures'
+expected_path = Path(__file__).resolve().parent / 'expected'
+
+#Methods
+def set_up_sources(data_path):
+    """
+    Copy the fixture source files to the paths where process_data looks for them, and
+    disable everything that keeps state between runs.
+
+    Args:
+        data_path (Path): Folder where the source files and the ids are saved.
+    """
+    settings.default_data_path = str(data_path)
+    settings.id_mappings_path = str(data_path / 'id_mappings.json')
+    settings.row_ids_path = str(data_path / 'row_ids.pkl')
+    settings.processed_cache_path = ''
+    settings.blob_store_path = ''
+    settings.process_workers = 1
+    settings.metrics_path = str(data_path / 'metrics.jsonl')
+    challenge.now = dt.datetime(2022, 6, 1)
+    for name in challenge.sources.keys():
+        file_path = Path(challenge.get_source_file_path(name))
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(fixtures_path / f'{name}.csv', file_path)
+
+def to_csv(df):
+    """
+    Get the text of a processed table, without its load datetime.
+
+    Args:
+        df (DataFrame): Processed table.
+
+    Returns:
+        str: The table as .csv text.
+    """
+    #(with the same line endings on every platform)
+    return df.drop(columns='fecha_carga').to_csv(index=False).replace('\r\n', '\n')
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    """
+    Set up the fixture source files on a temporary folder (the settings changed by
+    set_up_sources are restored after the test).
+    """
+    for name in ['default_data_path', 'id_mappings_path', 'row_ids_path', 'processed_cache_path', 'blob_store_path', 'process_workers', 'metrics_path']:
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+    monkeypatch.setattr(challenge, 'now', challenge.now)
+    set_up_sources(tmp_path)
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_process_data(sources, monkeypatch, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(settings, 'csv_engine', engine)
+    data = challenge.process_data()
+    assert sorted(data.keys()) == sorted(path.stem for path in expected_path.glob('*.csv'))
+    for table, df in data.items():
+        assert to_csv(df) == (expected_path / f'{table}.csv').read_text(encoding='utf_8'), table
+
+def test_process_data_chunked(sources):
+    data, chunks = challenge.process_data_chunked(
+        chunk_size=2, spool_path=str(Path(settings.default_data_path) / 'espacios_culturales.spool'))
+    chunks = list(chunks["espacios_culturales"])
+    #Every chunk has the columns and dtypes of the espacios_culturales table
+    for chunk in chunks:
+        assert chunk.dtypes.equals(data["espacios_culturales"].dtypes)
+    data["espacios_culturales"] = pd.concat(chunks, ignore_index=True)
+    for table, df in data.items():
+        assert to_csv(df) == (expected_path / f'{table}.csv').read_text(encoding='utf_8'), table
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+@pytest.mark.parametrize('name', list(challenge.sources.keys()))
+def test_normalize_dataframe(monkeypatch, name, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(settings, 'csv_engine', engine)
+    df = challenge.read_source_csv(name, str(fixtures_path / f'{name}.csv'))
+    df = df[challenge.source_registry[name]["columns"]]
+    df.columns = challenge.source_column_names
+    result = challenge.normalize_dataframe(df.copy())
+    expected = benchmark.normalize_dataframe_rowwise(df.copy())
+    #The row-wise version turned the null values of string columns into 'nan' (or 'None') strings,
+    #and the columns with only null values into float columns, so only the values are compared
+    expected = expected.mask(expected.isin(['nan', 'None']))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+#This is called when test_process_data.py is run directly: update the expected tables
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as data_path:
+        set_up_sources(Path(data_path))
+        for table, df in challenge.process_data().items():
+            (expected_path / f'{table}.csv').write_text(to_csv(df), encoding='utf_8')
@@ -0,0 +1,69 @@
+"""
+    Tests of the stable ids of espacios culturales (challenge.get_row_ids), kept between runs
+    by its natural key.
+"""
+
+#Imports
+import numpy as np
+import pandas as pd
+#Program modules
+import challenge
+
+#Methods
+def get_rows(names):
+    """
+    Build espacios_culturales rows with the natural key columns, one per name.
+
+    Args:
+        names (list): Names of the rows (repeated names are rows with the same natural key).
+
+    Returns:
+        DataFrame: The rows.
+    """
+    return pd.DataFrame({
+        "categoria" : "Museos",
+        "id_localidad" : [6441030.0] * len(names),
+        "nombre" : names,
+        "domicilio" : [None] * len(names)
+    })
+
+def run(names, file_path, n_chunks=1):
+    """
+    Give ids to some rows as a run does (in chunks, if 'n_chunks' > 1), saving them.
+
+    Args:
+        names (list): Names of the rows.
+        file_path (str): Path to the ids file.
+        n_chunks (int, optional): Number of chunks. Defaults to 1.
+
+    Returns:
+        list: Ids of the rows.
+    """
+    row_ids = challenge.load_row_ids(file_path)
+    ids = [challenge.get_row_ids(chunk, row_ids) for chunk in np.array_split(get_rows(names), n_chunks)]
+    challenge.save_row_ids(row_ids, file_path)
+    return list(np.concatenate(ids))
+
+def test_ids_kept_when_rows_added(tmp_path):
+    file_path = str(tmp_path / 'row_ids.pkl')
+    assert run(['a', 'b', 'c'], file_path) == [0, 1, 2]
+    #A new row at the top doesn't shift the others
+    assert run(['new', 'a', 'b', 'c'], file_path) == [3, 0, 1, 2]
+
+def test_repeated_natural_keys_across_chunks(tmp_path):
+    file_path = str(tmp_path / 'row_ids.pkl')
+    names = ['a', 'b', 'a', 'c', 'a', 'b']
+    ids = run(names, file_path)
+    assert ids == [0, 1, 2, 3, 4, 5]
+    #The same ids, in any chunking
+    assert run(names, file_path, n_chunks=3) == ids
+    assert run(names, file_path, n_chunks=6) == ids
+
+def test_ids_not_seen_are_dropped(tmp_path):
+    file_path = str(tmp_path / 'row_ids.pkl')
+    run(['a', 'b', 'c'], file_path)
+    run(['a', 'c'], file_path)
+    saved = pd.read_pickle(file_path)
+    assert sorted(saved["ids"]["id"]) == [0, 2]
+    #Ids are never reused
+    assert run(['a', 'b'], file_path) == [0, 3]
@@ -0,0 +1,55 @@
+"""
+    Tests of the changes applied to existing tables when the SQL script generated by
+    save_sql_tables changes (challenge.get_schema_changes).
+"""
+
+#Imports
+import pandas as pd
+#Program modules
+import challenge
+import psql
+
+#Methods
+def get_statements(data, file_path):
+    """
+    Get the statements of the SQL script generated for some tables.
+
+    Args:
+        data (dict): Containing table names as keys, and DataFrames as values.
+        file_path (Path): Path where the SQL script is saved.
+
+    Returns:
+        list: SQL statements (str).
+    """
+    challenge.save_sql_tables(str(file_path), data)
+    return challenge.get_schema_statements(file_path.read_text())
+
+def test_changed_columns_are_altered(tmp_path, monkeypatch):
+    monkeypatch.setattr(psql, 'get_missing_tables', lambda table_names: [])
+    old_statements = get_statements({
+        "provincias" : pd.DataFrame({"id_provincia" : [1], "provincia" : ['a']}),
+        "espacios_culturales" : pd.DataFrame({"id" : [1], "id_provincia" : [1], "cp" : [1], "web" : ['a']})
+    }, tmp_path / 'old.sql')
+    statements = get_statements({
+        "provincias" : pd.DataFrame({"id_provincia" : [1], "provincia" : ['a']}),
+        "espacios_culturales" : pd.DataFrame({"id" : [1], "cp" : ['1'], "web" : ['a'], "mail" : ['a']})
+    }, tmp_path / 'new.sql')
+    changes, rebuilt_tables = challenge.get_schema_changes(old_statements, statements)
+    assert changes == [
+        'ALTER TABLE espacios_culturales DROP COLUMN IF EXISTS id_provincia;',
+        'ALTER TABLE espacios_culturales ALTER COLUMN cp TYPE VARCHAR(255) USING cp::VARCHAR(255);',
+        'ALTER TABLE espacios_culturales ADD COLUMN IF NOT EXISTS mail VARCHAR(255);',
+        #The foreign key removed from the script is dropped, with its index
+        'ALTER TABLE espacios_culturales DROP CONSTRAINT IF EXISTS fk_id_provincia;',
+        'DROP INDEX IF EXISTS ix_espacios_culturales_id_provincia;'
+    ]
+    assert rebuilt_tables == []
+
+def test_changed_primary_key_rebuilds_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(psql, 'get_missing_tables', lambda table_names: [])
+    old_statements = get_statements({"categorias" : pd.DataFrame({"id_categoria" : [1], "categoria" : ['a']})},
+        tmp_path / 'old.sql')
+    statements = get_statements({"categorias" : pd.DataFrame({"categoria" : ['a'], "id_categoria" : [1]})},
+        tmp_path / 'new.sql')
+    assert challenge.get_schema_changes(old_statements, statements) == \
+        (['DROP TABLE IF EXISTS categorias CASCADE;'], ['categorias'])